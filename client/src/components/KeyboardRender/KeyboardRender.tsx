@@ -243,6 +243,7 @@ export class KeyboardRender extends React.Component<KeyboardRenderProps, Keyboar
                 () => gl.uniform3fv(tUniformLoc("uColor"), instr.keycapColor),
                 () => gl.uniform1i(tUniformLoc("uTexture"), 0),
                 () => gl.uniform3fv(tUniformLoc("uTextureColor"), instr.legendColor),
+                () => gl.uniform4fv(tUniformLoc("uTextureRect"), instr.legendRect),
                 () => gl.uniform1i(tUniformLoc("uIsBlinking"), Number(!this.state.fullCustom && this.state.highlightKeys && instr.colorOptions.length > 1)),
                 () => gl.uniform1f(tUniformLoc("uBlinkProportion"), this.state.blinkProportion)
             ]);
@@ -466,6 +467,7 @@ export class KeyboardRender extends React.Component<KeyboardRenderProps, Keyboar
                     keysize,
                     transformation: finalTransformationMat,
                     legendTexture: texture,
+                    legendRect: [0, 0, 1, 1],
                     objectId,
                     ...this.getKeycapColorOptions(key, keycapsInfo, keysInSet),
                 };
@@ -48,6 +48,8 @@ export interface KeyRenderInstruction extends KeycapColor {
     keysize: number;
     transformation: mat4;
     legendTexture: WebGLTexture;
+    // where the legend sits in legendTexture: [u0, v0, u1, v1], [0, 0, 1, 1] for a texture of its own
+    legendRect: [number, number, number, number];
     colorOptions: KeycapColor[];
     optionSelected: number;
     objectId: number;
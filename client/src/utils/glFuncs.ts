@@ -201,6 +201,8 @@ export function setupShaders(gl: WebGLRenderingContext): WebGLProgramsInfo | und
 
         uniform sampler2D uTexture;
         uniform vec3 uTextureColor;
+        // u0, v0, u1, v1 of the legend within uTexture; a legend atlas holds its neighbours outside of it
+        uniform vec4 uTextureRect;
 
         uniform bool uIsBlinking;
         uniform float uBlinkProportion;
@@ -211,7 +213,8 @@ export function setupShaders(gl: WebGLRenderingContext): WebGLProgramsInfo | und
             vec3 color = uColor;
 
             vec2 actualUV = vec2(1.0 - vVertexUV.s, vVertexUV.t);
-            if (actualUV.x >= 0.0 && actualUV.y >= 0.0) {
+            if (actualUV.x >= 0.0 && actualUV.y >= 0.0
+                    && all(greaterThanEqual(actualUV, uTextureRect.xy)) && all(lessThanEqual(actualUV, uTextureRect.zw))) {
                 vec4 baseTextureColor = texture2D(uTexture, actualUV);
                 baseTextureColor.r = 1.0;
                 baseTextureColor.g = 1.0;
@@ -352,7 +355,7 @@ export function setupShaders(gl: WebGLRenderingContext): WebGLProgramsInfo | und
         ...assignLocations(
             texturedProgram,
             { aVertexPosition: V_INFO, aVertexNormal: N_INFO, aVertexUV: UV_INFO },
-            ["uColor", "uEyePosition", "uModelMat", "uMVPMat", "uTexture", "uTextureColor", "uIsBlinking", "uBlinkProportion"]
+            ["uColor", "uEyePosition", "uModelMat", "uMVPMat", "uTexture", "uTextureColor", "uTextureRect", "uIsBlinking", "uBlinkProportion"]
         )
     };
 
@@ -0,0 +1,131 @@
+import argparse
+import glob
+import os
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from buildcache import BuildManifest
+from decimate import build_lods, parse_errors
+from keycapmodels import keycap_name
+from meshformat import FORMATS, write_mesh, write_obj
+from meshindex import index_mesh, report
+from objparse import iter_blocks, parse_block
+from vertexcache import optimize
+
+# converts every keycap object of one or more profile OBJ files into
+# <out>/<profile>/<model>.<format>, the layout served by server/routes/models.ts
+DEFAULT_OUT = '../server/assets/models/keycaps'
+
+# bump whenever a change here would produce different output from the same source
+CONVERTER_VERSION = 2
+
+
+def find_sources(patterns):
+    # a source is an obj file, a directory of obj files or a glob
+    sources = []
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*.obj')
+        matches = sorted(glob.glob(pattern))
+        if not matches:
+            raise FileNotFoundError(f'no obj files match {pattern}')
+        sources += matches
+    return sources
+
+
+def profile_for(source, profile):
+    # without an explicit profile, resources/sa/caps.obj belongs to 'sa'
+    return profile or os.path.basename(os.path.dirname(os.path.abspath(source)))
+
+
+def convert_object(block, out_dir, fmt, lod_errors, debug_obj):
+    obj = parse_block(block)
+    name = keycap_name(obj.name)
+    mesh, stats = index_mesh(obj.positions, obj.normals, obj.uvs, obj.tris)
+    # lods are simplified from the exported order; each one is reordered for the vertex cache on its own
+    write_mesh(os.path.join(out_dir, name), optimize(mesh), fmt)
+    for level, lod in enumerate(build_lods(mesh, lod_errors), start=1):
+        write_mesh(os.path.join(out_dir, f'{name}.lod{level}'), optimize(lod), fmt)
+    if debug_obj:
+        write_obj(os.path.join(out_dir, f'{name}_test.obj'), mesh)
+    return name, stats
+
+
+def model_name(block_name):
+    # the model a block converts to, None for objects that aren't keycaps (or have no name)
+    try:
+        return keycap_name(block_name)
+    except (TypeError, ValueError):
+        return None
+
+
+def convert_all(sources, profile, out_root, fmt, workers, lod_errors=(), debug_obj=False, force=False):
+    # only objects whose block text, converter version or options changed since the last run are rebuilt.
+    # objects that aren't named like keycaps or fail to convert are reported and left out, and
+    # returned as (source, object name) in failed
+    manifest = BuildManifest(out_root, CONVERTER_VERSION)
+    options = {'format': fmt, 'lods': list(lod_errors)}
+    converted = []
+    skipped = 0
+    failed = []
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            pending = {}
+
+            def collect(done):
+                for future in done:
+                    source, block_name, asset_path, digest = pending.pop(future)
+                    try:
+                        name, stats = future.result()
+                    except Exception as e:
+                        print(f'{source}: failed to convert {block_name!r}: {e!r}')
+                        failed.append((source, block_name))
+                        continue
+                    manifest.record(asset_path, digest, options)
+                    report(name, stats)
+                    converted.append(name)
+
+            for source in sources:
+                out_dir = os.path.join(out_root, profile_for(source, profile))
+                os.makedirs(out_dir, exist_ok=True)
+                # blocks are streamed one at a time; cap the queue so the whole file is never in flight
+                for block in iter_blocks(source):
+                    name = model_name(block.name)
+                    if name is None:
+                        print(f'{source}: skipping object {block.name!r}, not a keycap name')
+                        failed.append((source, block.name))
+                        continue
+                    asset_path = os.path.join(out_dir, f'{name}.{fmt}')
+                    if not force and manifest.is_current(asset_path, block.digest, options):
+                        skipped += 1
+                        continue
+                    if len(pending) >= workers * 2:
+                        collect(wait(pending, return_when=FIRST_COMPLETED)[0])
+                    future = pool.submit(convert_object, block, out_dir, fmt, lod_errors, debug_obj)
+                    pending[future] = (source, block.name, asset_path, block.digest)
+
+            collect(wait(pending)[0])
+    finally:
+        # whatever finished before a failure stays recorded
+        manifest.save()
+    return converted, skipped, failed
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='convert keycap profile OBJ files in parallel')
+    parser.add_argument('sources', nargs='+', help='obj files, directories of obj files or globs')
+    parser.add_argument('--profile', help='profile name, defaults to the directory each source is in')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='root keycap model directory')
+    parser.add_argument('--format', choices=FORMATS, default='json',
+                        help='json is what routes/models.ts serves today, bin is the packed buffer format')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--lod-errors', type=parse_errors, default=[],
+                        help='comma separated error budgets, writes <model>.lod1, .lod2, ... per budget')
+    parser.add_argument('--debug-obj', action='store_true', help='also write a _test.obj next to every rebuilt model')
+    parser.add_argument('--force', action='store_true', help='rebuild everything regardless of the build manifest')
+    args = parser.parse_args()
+
+    converted, skipped, failed = convert_all(find_sources(args.sources), args.profile, args.out, args.format,
+                                             args.workers, args.lod_errors, args.debug_obj, args.force)
+    print(f'{len(converted)} models converted, {skipped} unchanged, {len(failed)} skipped or failed')
+    if failed:
+        raise SystemExit(1)
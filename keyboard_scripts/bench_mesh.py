@@ -0,0 +1,115 @@
+import glob
+import json
+import os
+import tempfile
+import time
+
+from meshformat import encode_bin, encode_json, write_obj
+from meshindex import index_mesh
+from objparse import iter_objects
+
+# compares the numpy converter core against the per-element python loops the converter scripts
+# used to run, on OBJ files rebuilt from the models bundled with the server
+MODELS_DIR = '../server/assets/models'
+REPEAT = 3
+
+
+def legacy_convert(path):
+    # the original loadkeycaps.py loop, kept as-is apart from flushing the last object
+    meshes = []
+    all_verts, all_normals, all_uvs, all_tris = [], [], [], []
+    offsets = [0, 0, 0]
+
+    def flush():
+        norms = [None for _ in all_verts]
+        uvs = [None for _ in all_verts]
+        tris = []
+        for tri in all_tris:
+            for pi, ti, ni in tri:
+                uvs[pi - offsets[0]] = all_uvs[ti - offsets[1]]
+                norms[pi - offsets[0]] = all_normals[ni - offsets[2]]
+            tris.append([v[0] - offsets[0] for v in tri])
+        meshes.append(json.dumps({'vertices': all_verts, 'normals': norms, 'triangles': tris, 'uvs': uvs}))
+
+    with open(path) as f:
+        for line in f:
+            words = line.strip().split(' ')
+            data = words[1:]
+            if words[0] == 'o':
+                if all_tris:
+                    flush()
+                    offsets[0] += len(all_verts)
+                    offsets[1] += len(all_uvs)
+                    offsets[2] += len(all_normals)
+                    all_verts, all_normals, all_uvs, all_tris = [], [], [], []
+            elif words[0] == 'v':
+                all_verts.append([float(x) for x in data])
+            elif words[0] == 'vn':
+                all_normals.append([float(x) for x in data])
+            elif words[0] == 'vt':
+                all_uvs.append([float(x) for x in data])
+            elif words[0] == 'f':
+                all_tris.append([[int(x) - 1 for x in d.split('/')] for d in data])
+    flush()
+    return meshes
+
+
+def numpy_convert(path):
+    meshes = []
+    for obj in iter_objects(path):
+        mesh, _ = index_mesh(obj.positions, obj.normals, obj.uvs, obj.tris)
+        meshes.append(encode_bin(mesh))
+    return meshes
+
+
+def build_fixture(out_path):
+    # one combined textured obj with every bundled model as its own object, like capstogether.obj
+    v_ofs = 0
+    with open(out_path, 'w') as f:
+        for path in sorted(glob.glob(os.path.join(MODELS_DIR, '**', '*.json'), recursive=True)):
+            with open(path) as mf:
+                model = json.loads(mf.read())
+            num_verts = len(model['vertices'])
+            if 'uvs' not in model:
+                model['uvs'] = [[0, 0]] * num_verts
+
+            f.write(f'o {os.path.splitext(os.path.basename(path))[0]}\n')
+            for v in model['vertices']:
+                f.write('v ' + ' '.join(map(str, v)) + '\n')
+            for uv in model['uvs']:
+                f.write('vt ' + ' '.join(map(str, uv)) + '\n')
+            for n in model['normals']:
+                f.write('vn ' + ' '.join(map(str, n)) + '\n')
+            for t in model['triangles']:
+                f.write('f ' + ' '.join(f'{i + v_ofs + 1}/{i + v_ofs + 1}/{i + v_ofs + 1}' for i in t) + '\n')
+            v_ofs += num_verts
+
+
+def best_time(fn, *args):
+    best = float('inf')
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        fixture = os.path.join(tmp, 'bundled.obj')
+        build_fixture(fixture)
+        print(f'fixture: {os.path.getsize(fixture) / 1024:.0f} KB')
+
+        legacy_time, legacy = best_time(legacy_convert, fixture)
+        numpy_time, converted = best_time(numpy_convert, fixture)
+        print(f'legacy loops: {len(legacy)} models in {legacy_time * 1000:.1f} ms, '
+              f'{sum(map(len, legacy)) / 1024:.0f} KB json')
+        print(f'numpy core:   {len(converted)} models in {numpy_time * 1000:.1f} ms, '
+              f'{sum(map(len, converted)) / 1024:.0f} KB bin')
+        print(f'speedup: {legacy_time / numpy_time:.1f}x')
+
+        obj = next(iter_objects(fixture))
+        mesh, _ = index_mesh(obj.positions, obj.normals, obj.uvs, obj.tris)
+        json_time, _ = best_time(encode_json, mesh)
+        obj_time, _ = best_time(write_obj, os.path.join(tmp, 'test.obj'), mesh)
+        print(f'writers on {obj.name}: json {json_time * 1000:.2f} ms, debug obj {obj_time * 1000:.2f} ms')
@@ -0,0 +1,37 @@
+import json
+import os
+
+# records, for every generated asset, what it was built from so unchanged assets can be skipped:
+#   { "<asset path relative to the manifest>": {"source": <sha1>, "version": <int>, "options": {...}} }
+MANIFEST_NAME = '.build_manifest.json'
+
+
+class BuildManifest:
+    def __init__(self, root, version):
+        self.root = root
+        self.version = version
+        self.path = os.path.join(root, MANIFEST_NAME)
+        self.entries = {}
+        if os.path.exists(self.path):
+            with open(self.path) as f:
+                self.entries = json.loads(f.read())
+
+    def _entry(self, digest, options):
+        return {'source': digest, 'version': self.version, 'options': options}
+
+    def _key(self, asset_path):
+        return os.path.relpath(asset_path, self.root).replace(os.sep, '/')
+
+    def is_current(self, asset_path, digest, options):
+        return (self.entries.get(self._key(asset_path)) == self._entry(digest, options)
+                and os.path.exists(asset_path))
+
+    def record(self, asset_path, digest, options):
+        self.entries[self._key(asset_path)] = self._entry(digest, options)
+
+    def save(self):
+        os.makedirs(self.root, exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps(self.entries, indent=4, sort_keys=True))
+        os.replace(tmp_path, self.path)
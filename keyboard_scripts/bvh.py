@@ -0,0 +1,334 @@
+import argparse
+import glob
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from instances import DEFAULT_KEYBOARD_INFO, SLOT_STABILIZER, SLOT_SWITCH, layout, slug
+from meshformat import read_mesh
+
+# bounding volumes for picking keys with the mouse. every model gets a <model>.bvh next to it
+# (all little-endian):
+#   header: magic 'KBDV', u16 version, u16 max leaf size, u32 node count, u32 triangle count
+#   nodes: f32 min[3], f32 max[3], u32 offset, u16 count, u16 axis, depth-first
+#     count == 0: inner node, the left child is the next node and the right one is node `offset`
+#     count > 0: leaf holding order[offset:offset + count]
+#   order: u32 triangle index per triangle, grouped by leaf
+# node 0's bounds are the model's aabb. the bvh is built with a binned surface area heuristic.
+# a keyboard's key bounds (the keycap aabbs moved through the instances.layout matrices, the
+# same ones KeyboardRender uses) are written to <out>/<keyboard>.keybounds.json:
+#   [{"key": <key>, "model": <model>, "min": [x, y, z], "max": [x, y, z]}, ...]
+MAGIC = b'KBDV'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+NODE = struct.Struct('<6fIHH')
+MODEL_DIR = '../server/assets/models'
+DEFAULT_OUT = '../server/assets/instances'
+MAX_LEAF = 4
+SAH_BINS = 12
+# relative cost of a node visit against a triangle test, for the heuristic
+TRAVERSAL_COST = 1.0
+
+
+def _sah_split(centroids, lo, hi):
+    # (axis, position, cost) of the best binned split of these triangles, or None
+    best = None
+    extent = centroids.max(axis=0) - centroids.min(axis=0)
+    for axis in range(3):
+        if extent[axis] <= 0:
+            continue
+        low = centroids[:, axis].min()
+        bins = np.minimum(((centroids[:, axis] - low) / extent[axis] * SAH_BINS).astype(int), SAH_BINS - 1)
+        counts = np.bincount(bins, minlength=SAH_BINS)
+        bin_lo = np.full((SAH_BINS, 3), np.inf)
+        bin_hi = np.full((SAH_BINS, 3), -np.inf)
+        np.minimum.at(bin_lo, bins, lo)
+        np.maximum.at(bin_hi, bins, hi)
+
+        def areas(box_lo, box_hi):
+            d = np.where(np.isfinite(box_lo), box_hi - box_lo, 0)
+            return 2 * (d[:, 0] * d[:, 1] + d[:, 1] * d[:, 2] + d[:, 2] * d[:, 0])
+
+        # bounds of everything left / right of each of the SAH_BINS - 1 planes
+        left_area = areas(np.minimum.accumulate(bin_lo)[:-1], np.maximum.accumulate(bin_hi)[:-1])
+        right_area = areas(np.minimum.accumulate(bin_lo[::-1])[::-1][1:],
+                           np.maximum.accumulate(bin_hi[::-1])[::-1][1:])
+        left_count = np.cumsum(counts)[:-1]
+        right_count = len(centroids) - left_count
+        cost = left_area * left_count + right_area * right_count
+        cost[(left_count == 0) | (right_count == 0)] = np.inf
+        plane = int(np.argmin(cost))
+        if np.isfinite(cost[plane]) and (best is None or cost[plane] < best[2]):
+            best = (axis, low + extent[axis] * (plane + 1) / SAH_BINS, float(cost[plane]))
+    return best
+
+
+def build_bvh(mesh, max_leaf=MAX_LEAF):
+    # returns (nodes [(min, max, offset, count, axis)], order)
+    verts = np.asarray(mesh['vertices'], dtype=np.float64)
+    corners = verts[np.asarray(mesh['triangles'], dtype=np.int64)]
+    tri_lo, tri_hi = corners.min(axis=1), corners.max(axis=1)
+    centroids = (tri_lo + tri_hi) / 2
+
+    nodes = []
+    order = []
+
+    def area(lo, hi):
+        d = hi - lo
+        return 2 * (d[0] * d[1] + d[1] * d[2] + d[2] * d[0])
+
+    def build(tris):
+        lo, hi = tri_lo[tris].min(axis=0), tri_hi[tris].max(axis=0)
+        index = len(nodes)
+        nodes.append(None)
+        split = _sah_split(centroids[tris], tri_lo[tris], tri_hi[tris]) if len(tris) > max_leaf else None
+        # a split only pays off if visiting two children is cheaper than testing every triangle here
+        if split is None or (len(tris) <= max_leaf * 4
+                             and TRAVERSAL_COST + split[2] / area(lo, hi) >= len(tris)):
+            if len(tris) > 0xffff:
+                raise ValueError('leaf too large for the node format')
+            if len(tris) > max_leaf and split is None:
+                # every centroid in the same spot; chunk them so leaves stay small
+                half = len(tris) // 2
+                nodes[index] = (lo, hi, 0, 0, 0)
+                build(tris[:half])
+                nodes[index] = (lo, hi, build(tris[half:]), 0, 0)
+                return index
+            nodes[index] = (lo, hi, len(order), len(tris), 0)
+            order.extend(tris.tolist())
+            return index
+        axis, position, _ = split
+        left = centroids[tris, axis] < position
+        if left.all() or not left.any():
+            # rounding put the plane outside the centroids; fall back to a median split
+            left = np.argsort(np.argsort(centroids[tris, axis], kind='stable')) < len(tris) // 2
+        build(tris[left])
+        nodes[index] = (lo, hi, build(tris[~left]), 0, axis)
+        return index
+
+    build(np.arange(len(corners)))
+    return nodes, np.array(order, dtype=np.uint32)
+
+
+def encode_bvh(nodes, order, max_leaf=MAX_LEAF):
+    head = HEADER.pack(MAGIC, VERSION, max_leaf, len(nodes), len(order))
+    body = b''.join(NODE.pack(*lo, *hi, offset, count, axis) for lo, hi, offset, count, axis in nodes)
+    return head + body + np.asarray(order, dtype='<u4').tobytes()
+
+
+def decode_bvh(buf):
+    magic, version, max_leaf, num_nodes, num_tris = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('not a bvh file')
+    if version != VERSION:
+        raise ValueError(f'unsupported bvh version {version}')
+    nodes = []
+    for i in range(num_nodes):
+        *bounds, offset, count, axis = NODE.unpack_from(buf, HEADER.size + i * NODE.size)
+        nodes.append((np.array(bounds[:3]), np.array(bounds[3:]), offset, count, axis))
+    start = HEADER.size + num_nodes * NODE.size
+    order = np.frombuffer(buf, dtype='<u4', count=num_tris, offset=start)
+    return nodes, order
+
+
+def aabb(nodes):
+    return nodes[0][0], nodes[0][1]
+
+
+def bvh_path(model_path):
+    return os.path.splitext(model_path)[0] + '.bvh'
+
+
+def read_bvh(path):
+    with open(path, 'rb') as f:
+        return decode_bvh(f.read())
+
+
+def ray_box(origin, inv_dir, lo, hi):
+    # entry distance of the ray into the box (slab test), inf on a miss
+    t1 = (lo - origin) * inv_dir
+    t2 = (hi - origin) * inv_dir
+    near = np.nanmax(np.minimum(t1, t2))
+    far = np.nanmin(np.maximum(t1, t2))
+    return near if far >= max(near, 0) else np.inf
+
+
+def ray_triangles(origin, direction, a, b, c):
+    # moller-trumbore against many triangles at once; distance per triangle, inf on a miss
+    e1, e2 = b - a, c - a
+    p = np.cross(direction, e2)
+    det = (e1 * p).sum(axis=-1)
+    ok = np.abs(det) > 1e-12
+    inv = np.where(ok, 1 / np.where(ok, det, 1), 0)
+    s = origin - a
+    u = (s * p).sum(axis=-1) * inv
+    q = np.cross(s, e1)
+    v = (direction * q).sum(axis=-1) * inv
+    t = (e2 * q).sum(axis=-1) * inv
+    hit = ok & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+    return np.where(hit, t, np.inf)
+
+
+def intersect(nodes, order, corners, origin, direction, max_t=np.inf):
+    # reference traversal: (distance, triangle index) of the closest hit or (inf, -1), and
+    # how many triangles were tested
+    origin = np.asarray(origin, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        inv_dir = 1 / direction
+    best_t, best_tri, tested = max_t, -1, 0
+    stack = [0]
+    while stack:
+        index = stack.pop()
+        lo, hi, offset, count, axis = nodes[index]
+        if ray_box(origin, inv_dir, lo, hi) >= best_t:
+            continue
+        if count:
+            tris = order[offset:offset + count]
+            t = ray_triangles(origin, direction, corners[tris, 0], corners[tris, 1], corners[tris, 2])
+            tested += count
+            i = int(np.argmin(t))
+            if t[i] < best_t:
+                best_t, best_tri = float(t[i]), int(tris[i])
+        else:
+            # near child first, so the far one can often be skipped
+            left, right = index + 1, offset
+            stack.extend((left, right) if direction[axis] < 0 else (right, left))
+    return (best_t, best_tri, tested) if best_tri >= 0 else (np.inf, -1, tested)
+
+
+def key_bounds(keyboard_info, model_bounds):
+    # world space aabb of every keycap of the layout
+    bounds = []
+    for key, model, slot, transform in layout(keyboard_info):
+        if slot in (SLOT_SWITCH, SLOT_STABILIZER) or model not in model_bounds:
+            continue
+        lo, hi = model_bounds[model]
+        corners = np.array([[x, y, z, 1] for x in (lo[0], hi[0]) for y in (lo[1], hi[1]) for z in (lo[2], hi[2])])
+        world = (transform @ corners.T).T[:, :3]
+        bounds.append({'key': key, 'model': model, 'transform': transform,
+                       'min': world.min(axis=0).tolist(), 'max': world.max(axis=0).tolist()})
+    return bounds
+
+
+def pick(keys, models, origin, direction):
+    # closest key under a world space ray: test the key boxes, then the hit keys' bvhs (nearest
+    # box first) in model space. models maps name -> (nodes, order, corners)
+    origin = np.asarray(origin, dtype=np.float64)
+    direction = np.asarray(direction, dtype=np.float64)
+    with np.errstate(divide='ignore'):
+        inv_dir = 1 / direction
+    candidates = sorted((ray_box(origin, inv_dir, np.array(k['min']), np.array(k['max'])), i) for i, k in enumerate(keys))
+    best_t, best_key, tested = np.inf, None, 0
+    for box_t, i in candidates:
+        if box_t >= best_t:
+            break
+        key = keys[i]
+        inverse = np.linalg.inv(key['transform'])
+        # the matrices are rigid, so distances along the ray are the same in model space
+        local_origin = (inverse @ np.append(origin, 1))[:3]
+        local_direction = inverse[:3, :3] @ direction
+        t, _, n = intersect(*models[key['model']], local_origin, local_direction, best_t)
+        tested += n
+        if t < best_t:
+            best_t, best_key = t, key['key']
+    return best_key, best_t, tested
+
+
+def brute_force_pick(keys, models, origin, direction):
+    # every triangle of every keycap, for checking pick() and as the benchmark baseline
+    best_t, best_key = np.inf, None
+    for key in keys:
+        corners = models[key['model']][2]
+        inverse = np.linalg.inv(key['transform'])
+        local_origin = (inverse @ np.append(origin, 1))[:3]
+        local_direction = inverse[:3, :3] @ direction
+        t = ray_triangles(local_origin, local_direction, corners[:, 0], corners[:, 1], corners[:, 2]).min()
+        if t < best_t:
+            best_t, best_key = t, key['key']
+    return best_key, best_t
+
+
+def find_models(model_dir):
+    return sorted(p for ext in ('json', 'bin') for p in glob.glob(os.path.join(model_dir, '**', f'*.{ext}'), recursive=True)
+                  if '.lod' not in os.path.basename(p))
+
+
+def _corners(mesh):
+    return np.asarray(mesh['vertices'], dtype=np.float64)[np.asarray(mesh['triangles'], dtype=np.int64)]
+
+
+def benchmark(keys, models, num_rays, seed=0):
+    # rays from above the board towards random points on it
+    rng = np.random.default_rng(seed)
+    lo = np.min([k['min'] for k in keys], axis=0)
+    hi = np.max([k['max'] for k in keys], axis=0)
+    targets = lo + rng.random((num_rays, 3)) * (hi - lo)
+    origins = targets + np.array([0, 10, 6]) + rng.normal(0, 1, (num_rays, 3))
+    directions = targets - origins
+    directions /= np.linalg.norm(directions, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    expected = [brute_force_pick(keys, models, o, d) for o, d in zip(origins, directions)]
+    brute_time = time.perf_counter() - start
+    start = time.perf_counter()
+    picked = [pick(keys, models, o, d) for o, d in zip(origins, directions)]
+    bvh_time = time.perf_counter() - start
+
+    mismatches = sum(1 for (key, t), (got, got_t, _) in zip(expected, picked)
+                     if key != got and not np.isclose(t, got_t))
+    total_tris = sum(len(models[k['model']][2]) for k in keys)
+    tested = np.mean([n for _, _, n in picked])
+    hits = sum(1 for key, _ in expected if key is not None)
+    print(f'{num_rays} rays, {hits} hit a key, {mismatches} picks differ from brute force')
+    print(f'brute force: {brute_time / num_rays * 1e3:.3f} ms/ray, {total_tris} triangles tested')
+    print(f'bounds + bvh: {bvh_time / num_rays * 1e3:.3f} ms/ray, {tested:.1f} triangles tested on average')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write per-model bvhs and per-keyboard key bounds for picking')
+    parser.add_argument('--models', default=MODEL_DIR)
+    parser.add_argument('--keyboard-info', default=DEFAULT_KEYBOARD_INFO)
+    parser.add_argument('--profile', default='cherry', help='keycap profile the key bounds are built from')
+    parser.add_argument('--out', default=DEFAULT_OUT, help='directory for the key bounds files')
+    parser.add_argument('--max-leaf', type=int, default=MAX_LEAF)
+    parser.add_argument('--benchmark', type=int, default=0, metavar='RAYS',
+                        help='ray cast this many random rays per keyboard against brute force')
+    args = parser.parse_args()
+
+    profile_dir = os.path.join(args.models, 'keycaps', args.profile)
+    keycaps = {}
+    for path in find_models(args.models):
+        mesh = read_mesh(path)
+        nodes, order = build_bvh(mesh, args.max_leaf)
+        with open(bvh_path(path), 'wb') as f:
+            f.write(encode_bvh(nodes, order, args.max_leaf))
+        leaves = [count for _, _, _, count, _ in nodes if count]
+        print(f'{path}: {len(order)} triangles, {len(nodes)} nodes, {len(leaves)} leaves, '
+              f'{os.path.getsize(bvh_path(path))} bytes')
+        if os.path.dirname(os.path.abspath(path)) == os.path.abspath(profile_dir):
+            keycaps[os.path.splitext(os.path.basename(path))[0]] = (nodes, order, _corners(mesh))
+
+    with open(args.keyboard_info) as f:
+        keyboards = json.loads(f.read())
+    os.makedirs(args.out, exist_ok=True)
+    written = set()
+    for name, info in keyboards.items():
+        keys = key_bounds(info, {model: aabb(nodes) for model, (nodes, _, _) in keycaps.items()})
+        # same file naming as the instance tables
+        file_name, n = slug(name), 1
+        while file_name in written:
+            n += 1
+            file_name = f'{slug(name)}_{n}'
+        written.add(file_name)
+        out_path = os.path.join(args.out, f'{file_name}.keybounds.json')
+        with open(out_path + '.tmp', 'w') as f:
+            f.write(json.dumps([{k: v for k, v in key.items() if k != 'transform'} for key in keys]))
+        os.replace(out_path + '.tmp', out_path)
+        print(f'{name} -> {out_path}: {len(keys)} keys')
+
+        if args.benchmark:
+            benchmark(keys, keycaps, args.benchmark)
@@ -0,0 +1,72 @@
+import json
+import os
+
+# append-only progress log for the scrapers, one JSON object per line:
+#   {"key": "<url the record came from>", "record": <anything json>}
+# appends are cheap and fsynced every `batch` records, so a crash loses at most one batch and a
+# resumed run only has to skip the keys it finds here. compact() turns the records into the pretty
+# JSON files the rest of the pipeline reads
+
+
+class Checkpoint:
+    def __init__(self, path, resume=False, batch=32):
+        self.path = path
+        self.batch = batch
+        self.records = {}
+        self.pending = 0
+
+        if resume and os.path.exists(path):
+            good = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('unterminated line')
+                        entry = json.loads(line)
+                    except ValueError:
+                        # a line cut off by a crash, everything from here on is dropped
+                        break
+                    self.records[entry['key']] = entry['record']
+                    good += len(line)
+            with open(path, 'rb+') as f:
+                f.truncate(good)
+            self.file = open(path, 'a', encoding='utf-8')
+        else:
+            self.file = open(path, 'w', encoding='utf-8')
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def append(self, key, record):
+        self.records[key] = record
+        self.file.write(json.dumps({'key': key, 'record': record}) + '\n')
+        self.pending += 1
+        if self.pending >= self.batch:
+            self.sync()
+
+    def sync(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.pending = 0
+
+    def close(self):
+        self.sync()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def checkpoint_path(out_path):
+    # keycaps_out2.json -> keycaps_out2.jsonl
+    return os.path.splitext(out_path)[0] + '.jsonl'
+
+
+def compact(data, out_path):
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(data, indent=4))
+    os.replace(tmp_path, out_path)
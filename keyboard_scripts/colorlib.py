@@ -0,0 +1,254 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+# merges the per-vendor color files in colors/ and compiles them into one memory-mappable library
+# (all little-endian):
+#   header: magic 'KBDC', u16 version, u16 library count, u32 color count, 4 bytes padding
+#   f64 rgb[count * 3], f32 lab[count * 3]      rgb in [0, 1], CIELAB (D65)
+#   u32 name offsets[count + 1]                 into the name blob, colors sorted by utf-8 name
+#   u8 library[count]                           index into the library names below
+#   library names: u8 length + utf-8 name each, then the name blob
+# so opening it is an mmap plus a few frombuffer views, and a name lookup is a binary search.
+# rgb is kept at full precision because it is what resolved colors are written out as; lab only
+# feeds nearest color searches
+COLOR_DIR = 'colors'
+# earlier libraries win when two define the same name. extras.json holds the hand-picked colors that
+# used to live only in allcolors.json
+LIBRARIES = ('gmk', 'pantone', 'ralcolors', 'ralcolors_design', 'sigplastics', 'extras')
+LIBRARY_PATH = os.path.join(COLOR_DIR, 'colors.lib')
+MERGED_PATH = os.path.join(COLOR_DIR, 'allcolors.json')
+
+MAGIC = b'KBDC'
+VERSION = 2
+HEADER = struct.Struct('<4sHHI4x')
+
+
+def srgb_to_lab(rgb):
+    # rgb floats in [0, 1], shape (n, 3), D65 white
+    rgb = np.asarray(rgb, dtype=np.float64)
+    linear = np.where(rgb <= 0.04045, rgb / 12.92, ((rgb + 0.055) / 1.055) ** 2.4)
+    xyz = linear @ np.array([
+        [0.4124564, 0.2126729, 0.0193339],
+        [0.3575761, 0.7151522, 0.1191920],
+        [0.1804375, 0.0721750, 0.9503041]
+    ])
+    xyz /= np.array([0.95047, 1.0, 1.08883])
+    f = np.where(xyz > (6 / 29) ** 3, np.cbrt(xyz), xyz / (3 * (6 / 29) ** 2) + 4 / 29)
+    return np.stack([116 * f[:, 1] - 16, 500 * (f[:, 0] - f[:, 1]), 200 * (f[:, 1] - f[:, 2])], axis=1)
+
+
+def validate(library, data):
+    # returns a list of problems; a library file is {name: [r, g, b]} with every channel in [0, 1]
+    if not isinstance(data, dict):
+        return [f'{library}: expected an object of name -> [r, g, b]']
+    problems = []
+    for name, rgb in data.items():
+        if not name.strip() or name != name.strip():
+            problems.append(f'{library}: bad name {name!r}')
+        if (not isinstance(rgb, list) or len(rgb) != 3
+                or not all(isinstance(c, (int, float)) and not isinstance(c, bool) and 0 <= c <= 1 for c in rgb)):
+            problems.append(f'{library}: {name!r} is not three channels in [0, 1]: {rgb!r}')
+    return problems
+
+
+def merge(color_dir=COLOR_DIR, libraries=LIBRARIES):
+    # returns ({name: (rgb, library)}, problems, conflicts)
+    merged = {}
+    problems = []
+    conflicts = []
+    folded = {}
+    for library in libraries:
+        path = os.path.join(color_dir, library + '.json')
+        try:
+            with open(path) as f:
+                data = json.loads(f.read())
+        except ValueError as e:
+            problems.append(f'{library}: {path} does not parse: {e}')
+            continue
+        found = validate(library, data)
+        problems += found
+        if found:
+            continue
+
+        for name, rgb in data.items():
+            if name in merged:
+                if merged[name][0] != rgb:
+                    conflicts.append(f'{name!r}: {merged[name][1]} {merged[name][0]} kept over {library} {rgb}')
+                continue
+            # names that only differ in case are found by the same lookups downstream
+            other = folded.setdefault(name.lower(), name)
+            if other != name:
+                conflicts.append(f'{name!r} ({library}) and {other!r} ({merged[other][1]}) only differ in case')
+            merged[name] = (rgb, library)
+    return merged, problems, conflicts
+
+
+def compile_library(merged, out_path=LIBRARY_PATH, libraries=LIBRARIES):
+    names = sorted(merged, key=lambda n: n.encode())
+    encoded = [n.encode() for n in names]
+    rgb = np.array([merged[n][0] for n in names], dtype=np.float64).reshape(-1, 3)
+    offsets = np.concatenate(([0], np.cumsum([len(e) for e in encoded]))).astype('<u4')
+    library_ids = np.array([libraries.index(merged[n][1]) for n in names], dtype=np.uint8)
+
+    parts = [
+        HEADER.pack(MAGIC, VERSION, len(libraries), len(names)),
+        rgb.astype('<f8').tobytes(),
+        srgb_to_lab(rgb).astype('<f4').tobytes(),
+        offsets.tobytes(),
+        library_ids.tobytes(),
+        b''.join(struct.pack('<B', len(lib.encode())) + lib.encode() for lib in libraries),
+        b''.join(encoded)
+    ]
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(b''.join(parts))
+    os.replace(tmp_path, out_path)
+
+
+def write_merged(merged, out_path=MERGED_PATH):
+    # the plain json view of the same library, kept for anything that still wants it
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps({name: rgb for name, (rgb, _) in merged.items()}, indent=4))
+    os.replace(tmp_path, out_path)
+
+
+class _Names:
+    # sequence view of the name table for bisect, decoding only the names it touches
+    def __init__(self, lib):
+        self.lib = lib
+
+    def __len__(self):
+        return len(self.lib)
+
+    def __getitem__(self, i):
+        return self.lib.name_bytes(i)
+
+
+class ColorLibrary:
+    def __init__(self, path=LIBRARY_PATH):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, num_libraries, count = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('not a compiled color library')
+        if version != VERSION:
+            raise ValueError(f'unsupported color library version {version}')
+
+        pos = HEADER.size
+        self.rgb = np.frombuffer(self._map, dtype='<f8', count=count * 3, offset=pos).reshape(count, 3)
+        pos += count * 24
+        self.lab = np.frombuffer(self._map, dtype='<f4', count=count * 3, offset=pos).reshape(count, 3)
+        pos += count * 12
+        self.offsets = np.frombuffer(self._map, dtype='<u4', count=count + 1, offset=pos)
+        pos += (count + 1) * 4
+        self.library_ids = np.frombuffer(self._map, dtype=np.uint8, count=count, offset=pos)
+        pos += count
+
+        self.libraries = []
+        for _ in range(num_libraries):
+            length = self._map[pos]
+            self.libraries.append(self._map[pos + 1:pos + 1 + length].decode())
+            pos += 1 + length
+        self.names_start = pos
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def name_bytes(self, i):
+        return self._map[self.names_start + int(self.offsets[i]):self.names_start + int(self.offsets[i + 1])]
+
+    def name(self, i):
+        return self.name_bytes(i).decode()
+
+    def names(self):
+        blob = self._map[self.names_start:self.names_start + int(self.offsets[-1])]
+        return [blob[a:b].decode() for a, b in zip(self.offsets[:-1], self.offsets[1:])]
+
+    def index(self, name):
+        # binary search over the sorted name table, -1 if absent
+        key = name.encode()
+        lo, hi = 0, len(self)
+        names = _Names(self)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if names[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(self) and names[lo] == key else -1
+
+    def get(self, name, default=None):
+        i = self.index(name)
+        return self.rgb[i].tolist() if i != -1 else default
+
+    def library(self, i):
+        return self.libraries[self.library_ids[i]]
+
+    def close(self):
+        # the numpy views must be dropped before the mapping can close
+        self.rgb = self.lab = self.offsets = self.library_ids = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_stale(out_path=LIBRARY_PATH, color_dir=COLOR_DIR, libraries=LIBRARIES):
+    if not os.path.exists(out_path):
+        return True
+    with open(out_path, 'rb') as f:
+        header = f.read(HEADER.size)
+    # written by an older version of this script
+    if len(header) < HEADER.size or HEADER.unpack(header)[:2] != (MAGIC, VERSION):
+        return True
+    built = os.path.getmtime(out_path)
+    return any(os.path.getmtime(os.path.join(color_dir, lib + '.json')) > built for lib in libraries)
+
+
+def build(color_dir=COLOR_DIR, out_path=LIBRARY_PATH, merged_path=None, libraries=LIBRARIES):
+    # merged_path also writes the merged json copy; only the command line asks for it, since
+    # allcolors.json is tracked and shouldn't change just because a script opened the library
+    merged, problems, conflicts = merge(color_dir, libraries)
+    for problem in problems:
+        print('error: ' + problem)
+    for conflict in conflicts:
+        print('conflict: ' + conflict)
+    if problems:
+        raise ValueError(f'{len(problems)} problems in the color libraries, nothing written')
+    compile_library(merged, out_path, libraries)
+    if merged_path:
+        write_merged(merged, merged_path)
+    return merged
+
+
+def open_library(path=LIBRARY_PATH):
+    # the compiled library, rebuilt first if any vendor file changed since it was written
+    if is_stale(path):
+        build(out_path=path)
+    return ColorLibrary(path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='validate, merge and compile the vendor color libraries')
+    parser.add_argument('--color-dir', default=COLOR_DIR)
+    parser.add_argument('--out', default=LIBRARY_PATH)
+    parser.add_argument('--merged', default=MERGED_PATH, help="merged json copy, '' to skip")
+    args = parser.parse_args()
+
+    merged = build(args.color_dir, args.out, args.merged)
+    counts = {}
+    for _, library in merged.values():
+        counts[library] = counts.get(library, 0) + 1
+    print(f'{len(merged)} colors ({", ".join(f"{lib} {n}" for lib, n in counts.items())}) -> '
+          f'{args.out}, {os.path.getsize(args.out)} bytes')
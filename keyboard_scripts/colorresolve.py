@@ -0,0 +1,195 @@
+import argparse
+import difflib
+import json
+import re
+import time
+from collections import namedtuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from colorlib import ColorLibrary, open_library, srgb_to_lab
+
+# turns the color names found in colorway tables ('GMK CR', 'Pantone 9182 C', 'RAL3015', '#1f2e3d')
+# into rgb from the compiled color library (colorlib.py). lookups go, in order:
+#   hex code -> the rgb itself
+#   normalized name -> exact hit in the token index
+#   every token of the name -> library names containing all of them, if that narrows it to one
+#   difflib close match against names of the same vendor with the same numbers and, for gmk and
+#   signature plastics, the same color code, so typos and spellings in the words are forgiven but
+#   a different code number or code ('SP ABS WAN' is not 'SP ABS WA') never is
+# and nearest() finds the closest library color to any rgb by CIELAB distance (delta E 1976)
+FUZZY_CUTOFF = 0.85
+
+# method is one of 'hex', 'exact', 'tokens', 'fuzzy'; name is the library name it resolved to
+Match = namedtuple('Match', ['name', 'rgb', 'method'])
+
+_WORD = re.compile(r'[a-z0-9]+')
+# 'ral3015', 'pms9182', '9182c': a vendor or suffix glued to a number
+_GLUED = re.compile(r'^(ral|pms|pantone)?(\d+)([a-z]+)?$')
+_HEX = re.compile(r'#?([0-9a-f]{6})$')
+_SEPARATORS = re.compile(r'[/(),;]|\bor\b')
+# spellings that mean the same thing
+_ALIASES = {'grey': 'gray', 'pms': 'pantone', 'signature': 'sp', 'gmk': ''}
+# pantone coated/uncoated/textile suffixes don't change which library color is meant
+_PANTONE_SUFFIXES = {'c', 'u', 'cp', 'up', 'tcx', 'tpx', 'tpg'}
+_VENDORS = ('pantone', 'ral', 'sp')
+# vendors whose names end in a color code that may be letters only
+_CODED_VENDORS = ('gmk', 'sp')
+
+
+def plain_key(name):
+    # lowercase words with aliases applied, nothing else. gmk codes like '3C' have to match here,
+    # before normalize() would read them as pantone numbers
+    words = [_ALIASES.get(w, w) for w in _WORD.findall(name.lower())]
+    return ' '.join(w for w in words if w and w != 'plastics')
+
+
+def normalize(name):
+    tokens = []
+    for word in plain_key(name).split():
+        glued = _GLUED.match(word)
+        if glued:
+            tokens += [_ALIASES.get(t, t) for t in glued.groups() if t]
+        else:
+            tokens.append(word)
+    if len(tokens) > 1 and tokens[-1] in _PANTONE_SUFFIXES:
+        tokens = tokens[:-1]
+        # '9182 C' on its own is how the set pages write pantone numbers
+        if tokens[0] not in _VENDORS:
+            tokens.insert(0, 'pantone')
+    return ' '.join(tokens)
+
+
+def vendor(key):
+    first = key.split(' ', 1)[0]
+    return first if first in _VENDORS else 'gmk'
+
+
+def fuzzy_group(key):
+    tokens = key.split()
+    numbers = tuple(t for t in tokens if t.isdigit())
+    code = tokens[-1] if tokens and vendor(key) in _CODED_VENDORS and not tokens[-1].isdigit() else None
+    return vendor(key), numbers, code
+
+
+class ColorResolver:
+    def __init__(self, colors):
+        # colors is a ColorLibrary or a plain {name: [r, g, b]} dict
+        if isinstance(colors, ColorLibrary):
+            self.names = colors.names()
+            # copied so the resolver outlives the library's mapping
+            self.rgb = colors.rgb.copy()
+            self.lab = colors.lab.astype(np.float64)
+        else:
+            self.names = list(colors)
+            self.rgb = np.array([colors[n] for n in self.names], dtype=np.float64)
+            self.lab = srgb_to_lab(self.rgb)
+        self.tree = cKDTree(self.lab)
+
+        # name key -> library index, token -> library indices, fuzzy group -> normalized names.
+        # by_key holds plain keys first, then the same without spaces ('gmk n-6' -> 'n6'), then
+        # normalized keys, and the first library name to claim a key keeps it
+        self.by_key = {}
+        self.by_token = {}
+        self.by_group = {}
+        for i, name in enumerate(self.names):
+            self.by_key.setdefault(plain_key(name), i)
+        for i, name in enumerate(self.names):
+            self.by_key.setdefault(plain_key(name).replace(' ', ''), i)
+        for i, name in enumerate(self.names):
+            key = normalize(name)
+            self.by_key.setdefault(key, i)
+            for token in key.split():
+                self.by_token.setdefault(token, set()).add(i)
+            self.by_group.setdefault(fuzzy_group(key), []).append(key)
+
+    def _match(self, i, method):
+        return Match(self.names[i], self.rgb[i].tolist(), method)
+
+    def resolve(self, text):
+        text = text.strip()
+        hex_code = _HEX.match(text.lower())
+        if hex_code:
+            h = hex_code.group(1)
+            return Match(None, [int(h[i:i + 2], 16) / 255 for i in (0, 2, 4)], 'hex')
+
+        plain = plain_key(text)
+        key = normalize(text)
+        if not key:
+            return None
+        for k in (plain, plain.replace(' ', ''), key):
+            if k in self.by_key:
+                return self._match(self.by_key[k], 'exact')
+
+        tokens = key.split()
+        if all(t in self.by_token for t in tokens):
+            found = set.intersection(*(self.by_token[t] for t in tokens))
+            if len(found) == 1:
+                return self._match(found.pop(), 'tokens')
+
+        close = difflib.get_close_matches(key, self.by_group.get(fuzzy_group(key), []), n=1, cutoff=FUZZY_CUTOFF)
+        if close:
+            return self._match(self.by_key[close[0]], 'fuzzy')
+
+        # 'Pantone 7545 C / RAL 7016', 'WS1 (Pantone 9224 C)': the first part that resolves wins
+        parts = [p for p in _SEPARATORS.split(text) if p.strip()]
+        if len(parts) > 1:
+            for part in parts:
+                match = self.resolve(part)
+                if match is not None:
+                    return match
+        return None
+
+    def nearest(self, rgb):
+        # (library names, delta E) of the closest library color to every rgb row
+        dist, idx = self.tree.query(srgb_to_lab(np.atleast_2d(rgb)))
+        return [self.names[i] for i in idx], dist
+
+
+def colorway_colors(keycap_colors):
+    # every rgb in a keycapcolors_out.json style dict, with a label saying where it came from
+    labels = []
+    rgbs = []
+    for set_name, info in keycap_colors.items():
+        if not isinstance(info, dict):
+            continue
+        for part, value in info.items():
+            if isinstance(value, dict):
+                value = [value.get('keycapColor'), value.get('legendColor')]
+            elif not isinstance(value, list):
+                continue
+            for which, rgb in zip(('keycap', 'legend'), value):
+                if isinstance(rgb, list) and len(rgb) == 3:
+                    labels.append(f'{set_name} {part} {which}')
+                    rgbs.append(rgb)
+    return labels, np.array(rgbs, dtype=np.float64).reshape(-1, 3)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='resolve color names, or name the colors of resolved colorways')
+    parser.add_argument('names', nargs='*', help='color names to resolve')
+    parser.add_argument('--colorways', help='e.g. keycapcolors_out.json; prints the nearest library color of each')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    resolver = ColorResolver(open_library())
+    print(f'{len(resolver.names)} library colors indexed in {(time.perf_counter() - start) * 1000:.1f} ms')
+
+    for name in args.names:
+        match = resolver.resolve(name)
+        if match is None:
+            print(f'{name}: no match')
+        else:
+            near, delta = resolver.nearest(match.rgb)
+            print(f'{name}: {match.name or "-"} ({match.method}) {match.rgb}, nearest {near[0]} dE {delta[0]:.2f}')
+
+    if args.colorways:
+        with open(args.colorways) as f:
+            labels, rgbs = colorway_colors(json.loads(f.read()))
+        start = time.perf_counter()
+        near, delta = resolver.nearest(rgbs)
+        elapsed = time.perf_counter() - start
+        for label, name, d in zip(labels, near, delta):
+            print(f'{label}: {name} dE {d:.2f}')
+        print(f'{len(labels)} colors matched in {elapsed * 1000:.1f} ms')
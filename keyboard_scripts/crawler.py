@@ -0,0 +1,113 @@
+import asyncio
+import os
+import random
+import time
+from urllib.parse import quote, urlsplit
+
+import aiohttp
+
+from httpcache import CacheMiss
+
+# shared async fetch engine for the scrapers. one aiohttp session (and so one connection pool) for
+# the whole crawl; every host gets its own concurrency limit and a minimum spacing between requests.
+# failed requests (connection errors, 429 and 5xx) are retried with exponential backoff plus jitter.
+# with an httpcache.HttpCache pages are revalidated instead of refetched, or replayed with no network
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    pass
+
+
+class _Host:
+    def __init__(self, concurrency, rate):
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.interval = 1 / rate if rate else 0
+        self.lock = asyncio.Lock()
+        self.next_start = 0.0
+
+    async def wait_turn(self):
+        # spaces out request starts so the host sees at most `rate` requests per second
+        async with self.lock:
+            now = time.monotonic()
+            delay = self.next_start - now
+            self.next_start = max(now, self.next_start) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class Crawler:
+    def __init__(self, per_host=4, rate=None, retries=3, backoff=0.5, timeout=30, record_dir=None, cache=None):
+        self.per_host = per_host
+        self.rate = rate
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        # every fetched page is also written here, ready to be served back by pageserver.py
+        self.record_dir = record_dir
+        self.cache = cache
+        self.hosts = {}
+        self.session = None
+        self.requests = 0
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.per_host)
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = _Host(self.per_host, self.rate)
+        return self.hosts[host]
+
+    async def fetch(self, url):
+        if self.cache is not None and self.cache.offline:
+            try:
+                return self.cache.offline_body(url)
+            except CacheMiss as e:
+                raise FetchError(str(e))
+
+        entry = self.cache.lookup(url) if self.cache is not None else None
+        headers = self.cache.conditional_headers(entry) if self.cache is not None else {}
+        host = self._host(url)
+        for attempt in range(self.retries + 1):
+            async with host.semaphore:
+                await host.wait_turn()
+                self.requests += 1
+                try:
+                    async with self.session.get(url, headers=headers) as resp:
+                        if resp.status == 304 and entry is not None:
+                            return self.cache.body(entry)
+                        if resp.status >= 400 and resp.status not in RETRY_STATUSES:
+                            # a missing or forbidden page stays that way, no point asking again
+                            raise FetchError(f'{url}: HTTP {resp.status}')
+                        if resp.status not in RETRY_STATUSES:
+                            text = await resp.text()
+                            if self.cache is not None:
+                                self.cache.store(url, text, resp.headers)
+                            if self.record_dir:
+                                record_page(self.record_dir, url, text)
+                            return text
+                        error = f'HTTP {resp.status}'
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    error = repr(e)
+            if attempt < self.retries:
+                await asyncio.sleep(self.backoff * 2 ** attempt * (1 + random.random()))
+        raise FetchError(f'{url}: {error} after {self.retries + 1} attempts')
+
+
+def page_file(url):
+    # recorded pages are stored by path and query, so one directory can stand in for one host
+    parts = urlsplit(url)
+    path = parts.path + ('?' + parts.query if parts.query else '')
+    return quote(path, safe='') or '%2F'
+
+
+def record_page(record_dir, url, text):
+    os.makedirs(record_dir, exist_ok=True)
+    with open(os.path.join(record_dir, page_file(url)), 'w', encoding='utf-8') as f:
+        f.write(text)
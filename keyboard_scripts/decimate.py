@@ -0,0 +1,203 @@
+import argparse
+import heapq
+import os
+
+import numpy as np
+
+from meshformat import read_mesh, write_mesh
+from meshindex import index_mesh
+
+# quadric error metric (garland & heckbert) simplification by half-edge collapses.
+# vertices that only differ in uv/normal are welded by position first so seams move together;
+# edges on an open boundary or uv seam get extra constraint planes so outlines and legend areas keep
+# their shape. the error of a collapse is the summed squared distance to the planes of the
+# original faces, so an error budget of e keeps every surviving vertex within roughly e of the surface.
+BOUNDARY_WEIGHT = 100.0
+# reject collapses that turn a face by more than ~80 degrees, which is what flips look like
+MIN_NORMAL_DOT = 0.2
+
+
+def _plane_quadrics(points, tris):
+    a, b, c = points[tris[:, 0]], points[tris[:, 1]], points[tris[:, 2]]
+    normals = np.cross(b - a, c - a)
+    lengths = np.linalg.norm(normals, axis=1)
+    keep = lengths > 0
+    normals = normals[keep] / lengths[keep, None]
+    planes = np.concatenate([normals, -np.einsum('ij,ij->i', normals, a[keep])[:, None]], axis=1)
+    return planes[:, :, None] * planes[:, None, :], keep
+
+
+def _quadrics(points, pos_tris, seam_tris):
+    quadrics = np.zeros((len(points), 4, 4))
+    face_q, keep = _plane_quadrics(points, pos_tris)
+    for k in range(3):
+        np.add.at(quadrics, pos_tris[keep, k], face_q)
+
+    # seam_tris numbers corners by (position, uv), so an edge used by only one triangle is either
+    # an open boundary or a uv seam. normal seams are left alone, the face planes already hold hard edges
+    edges = np.concatenate([seam_tris[:, [0, 1]], seam_tris[:, [1, 2]], seam_tris[:, [2, 0]]])
+    pos_edges = np.concatenate([pos_tris[:, [0, 1]], pos_tris[:, [1, 2]], pos_tris[:, [2, 0]]])
+    owner = np.tile(np.arange(len(pos_tris)), 3)
+    _, inverse, counts = np.unique(np.sort(edges, axis=1), axis=0, return_inverse=True, return_counts=True)
+    single = counts[inverse.ravel()] == 1
+    if single.any():
+        e0 = points[pos_edges[single, 0]]
+        e1 = points[pos_edges[single, 1]]
+        tri = pos_tris[owner[single]]
+        face_n = np.cross(points[tri[:, 1]] - points[tri[:, 0]], points[tri[:, 2]] - points[tri[:, 0]])
+        side = np.cross(e1 - e0, face_n)
+        lengths = np.linalg.norm(side, axis=1)
+        ok = lengths > 0
+        side = side[ok] / lengths[ok, None]
+        planes = np.concatenate([side, -np.einsum('ij,ij->i', side, e0[ok])[:, None]], axis=1)
+        q = BOUNDARY_WEIGHT * planes[:, :, None] * planes[:, None, :]
+        np.add.at(quadrics, pos_edges[single][ok, 0], q)
+        np.add.at(quadrics, pos_edges[single][ok, 1], q)
+    return quadrics
+
+
+def _cost(q, p):
+    h = np.append(p, 1.0)
+    return max(float(h @ q @ h), 0.0)
+
+
+class _Simplifier:
+    def __init__(self, points, pos_tris, quadrics):
+        self.points = points
+        self.tris = pos_tris.copy()
+        self.alive = np.ones(len(pos_tris), dtype=bool)
+        self.quadrics = quadrics
+        self.parent = np.arange(len(points))
+        self.stamp = np.zeros(len(points), dtype=np.int64)
+        self.faces_of = [set() for _ in range(len(points))]
+        for t, tri in enumerate(pos_tris):
+            for p in tri:
+                self.faces_of[p].add(t)
+        self.heap = []
+
+    def find(self, p):
+        root = p
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[p] != root:
+            self.parent[p], p = root, self.parent[p]
+        return root
+
+    def neighbours(self, p):
+        return {q for t in self.faces_of[p] for q in self.tris[t] if q != p}
+
+    def push(self, u, v):
+        q = self.quadrics[u] + self.quadrics[v]
+        # half-edge collapse: keep whichever endpoint is cheaper so attributes stay exact
+        cost_uv = _cost(q, self.points[v])
+        cost_vu = _cost(q, self.points[u])
+        if cost_vu < cost_uv:
+            u, v, cost_uv = v, u, cost_vu
+        heapq.heappush(self.heap, (cost_uv, u, v, self.stamp[u], self.stamp[v]))
+
+    def flips(self, u, v):
+        pv = self.points[v]
+        for t in self.faces_of[u]:
+            tri = self.tris[t]
+            if v in tri:
+                continue
+            a, b, c = (self.points[p] for p in tri)
+            before = np.cross(b - a, c - a)
+            moved = [pv if p == u else self.points[p] for p in tri]
+            after = np.cross(moved[1] - moved[0], moved[2] - moved[0])
+            norm = np.linalg.norm(before) * np.linalg.norm(after)
+            if norm == 0 or before @ after < MIN_NORMAL_DOT * norm:
+                return True
+        return False
+
+    def collapse(self, u, v):
+        for t in list(self.faces_of[u]):
+            tri = self.tris[t]
+            if v in tri:
+                self.alive[t] = False
+                for p in tri:
+                    self.faces_of[p].discard(t)
+            else:
+                tri[tri == u] = v
+                self.faces_of[v].add(t)
+        self.faces_of[u] = set()
+        self.parent[u] = v
+        self.quadrics[v] += self.quadrics[u]
+        self.stamp[u] += 1
+        self.stamp[v] += 1
+        for w in self.neighbours(v):
+            self.push(v, w)
+
+    def run(self, max_error):
+        for u in range(len(self.points)):
+            for v in self.neighbours(u):
+                if u < v:
+                    self.push(u, v)
+
+        budget = max_error ** 2
+        while self.heap:
+            cost, u, v, stamp_u, stamp_v = heapq.heappop(self.heap)
+            if cost > budget:
+                break
+            if stamp_u != self.stamp[u] or stamp_v != self.stamp[v]:
+                continue
+            if self.parent[u] != u or self.parent[v] != v or self.flips(u, v):
+                continue
+            self.collapse(u, v)
+
+
+def simplify(mesh, max_error):
+    verts = np.asarray(mesh['vertices'], dtype=np.float64)
+    normals = np.asarray(mesh['normals'], dtype=np.float32)
+    uvs = mesh.get('uvs')
+    vert_tris = np.asarray(mesh['triangles'], dtype=np.int64)
+
+    points, pos_of_vert = np.unique(verts, axis=0, return_inverse=True)
+    pos_of_vert = pos_of_vert.ravel()
+    pos_tris = pos_of_vert[vert_tris]
+
+    if uvs is not None:
+        _, uv_of_vert = np.unique(np.asarray(uvs), axis=0, return_inverse=True)
+        _, seam_ids = np.unique(np.stack([pos_of_vert, uv_of_vert.ravel()], axis=1), axis=0, return_inverse=True)
+        seam_tris = seam_ids.ravel()[vert_tris]
+    else:
+        seam_tris = pos_tris
+
+    simplifier = _Simplifier(points, pos_tris, _quadrics(points, pos_tris, seam_tris))
+    simplifier.run(max_error)
+
+    # every original corner keeps its own uv/normal but moves to wherever its position collapsed to
+    final_pos = np.array([simplifier.find(p) for p in range(len(points))])
+    kept = vert_tris[simplifier.alive]
+    tris = np.stack([final_pos[pos_of_vert[kept]], kept, kept], axis=2)
+    return index_mesh(points.astype(np.float32), normals,
+                      np.asarray(uvs, dtype=np.float32) if uvs is not None else None, tris)[0]
+
+
+def lod_path(path, level):
+    # server/assets/models/keycaps/cherry/R1_1U.json -> .../R1_1U.lod1 (the format adds the extension)
+    return f'{os.path.splitext(path)[0]}.lod{level}'
+
+
+def build_lods(mesh, errors):
+    return [simplify(mesh, error) for error in errors]
+
+
+def parse_errors(text):
+    return [float(x) for x in text.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write quadric-simplified levels of detail next to mesh assets')
+    parser.add_argument('models', nargs='+', help='.json or .bin mesh assets')
+    parser.add_argument('--errors', type=parse_errors, default=[0.002, 0.01],
+                        help='comma separated error budget per level, in model units')
+    parser.add_argument('--format', choices=('bin', 'json'), default='json')
+    args = parser.parse_args()
+
+    for path in args.models:
+        mesh = read_mesh(path)
+        for level, lod in enumerate(build_lods(mesh, args.errors), start=1):
+            write_mesh(lod_path(path, level), lod, args.format)
+            print(f'{path} lod{level}: {len(mesh["triangles"])} -> {len(lod["triangles"])} triangles, '
+                  f'{len(mesh["vertices"])} -> {len(lod["vertices"])} vertices')
@@ -1,9 +1,18 @@
 import requests
-import xml.etree.ElementTree as ET
 import json
 import os
-from bs4 import BeautifulSoup
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import lxml.html
+
+from checkpoint import Checkpoint, checkpoint_path, compact
+from colorlib import open_library
+from colorresolve import ColorResolver
+from palette import encode, palette_path, write_palette
+from scrapediff import changes_path, diff, summary, write_changes
+from httpcache import HttpCache
 
 # COLORS = ['yellow', 'orange', 'red', 'violet', 'blue', 'green', 'grey', 'brown', 'white-and-black']
 
@@ -197,43 +206,72 @@ keycaps = []
 with open('resources/items/keycaps.json') as f:
     keycaps = [x['Name'] for x in json.loads(f.read())]
 
-colors = {}
-with open('colors/allcolors.json') as f:
-    colors = json.loads(f.read())
+resolver = ColorResolver(open_library())
+
+OUT_PATH = 'keycapcolors_out.json'
+# pass --resume to skip the sets an interrupted run already got through
+checkpoint = Checkpoint(checkpoint_path(OUT_PATH), resume='--resume' in sys.argv[1:])
+# pages are revalidated against the http cache; pass --offline to only replay cached pages
+cache = HttpCache(offline='--offline' in sys.argv[1:])
+session = requests.Session()
+
+# pages are parsed straight from memory with lxml, which understands the same ElementPath queries
+# the ElementTree version used. cell text is reduced to ascii afterwards, like the old page filter did
+def parse_page(html):
+    return lxml.html.fromstring(html)
+
+
+def text(el):
+    return (el.text or '').encode('ascii', 'ignore').decode()
+
+
+def tail(el):
+    return (el.tail or '').encode('ascii', 'ignore').decode()
+
+
+def cells(row):
+    # element children only, comments inside a row used to be dropped by the xml parser
+    return [c for c in row if isinstance(c.tag, str)]
 
-kc_data = {}
-html = requests.get("https://matrixzj.github.io/docs/gmk-keycaps").text
-soup = BeautifulSoup(html)
-html = soup.prettify()
-html = ''.join([c for c in html if c.isascii()])
-html = html.replace('xlink:href', 'href')
-with open('colors/temp.xml', 'w') as f:
-    f.write(html)
 
-tree = ET.parse('colors/temp.xml')
-root = tree.getroot()
-os.remove('colors/temp.xml')
+def parse_set_page(html):
+    # returns (raw set name, [(row head, base color, legend color)]) or (raw set name, None) when the
+    # page has no usable color table. only plain data comes back so this can run in any worker
+    root = parse_page(html)
+    name = tail(root.find(".//div[@id='main-content']/h1/a"))
+
+    info = root.findall(".//table")
+    def predicate(table):
+        headers = table.findall(".//thead/tr/th")
+        return len(headers) == 3 and len([h for h in headers if "price" in text(h).lower()]) == 0
+    tables = [t for t in info if predicate(t)]
+    if len(tables) != 1:
+        return name, None
+    table = tables[0]
+    header = table.findall('.//thead/tr/th')
+    if text(header[1]).strip().lower() != 'base color' or text(header[2]).strip().lower() != 'legend color':
+        return name, None
+
+    rows = []
+    for row in table.findall('.//tbody/tr'):
+        row = cells(row)
+        rows.append((text(row[0]).strip(), text(row[1]).strip(), text(row[2]).strip()))
+    return name, rows
 
 
+def fetch_set(href):
+    return href, parse_set_page(cache.get(href, session))
 
+
+root = parse_page(cache.get("https://matrixzj.github.io/docs/gmk-keycaps", session))
 main = root.find(".//div[@id='main-content']")
-links = main.findall(".//li/a")[1:]
-for link in links:
-    href = link.attrib['href']
-    html = requests.get(href).text
-    soup = BeautifulSoup(html)
-    html = soup.prettify()
-    html = ''.join([c for c in html if c.isascii()])
-    html = html.replace('xlink:href', 'href')
-    with open('colors/temp2.xml', 'w') as f:
-        f.write(html)
-
-    tree = ET.parse('colors/temp2.xml')
-    os.remove('colors/temp2.xml')
-    root = tree.getroot()
-
-    name = root.find(".//div[@id='main-content']/h1/a").tail
-    name = ''.join([c for c in name if c.isascii()]).strip()
+links = [link.attrib['href'] for link in main.findall(".//li/a")[1:]]
+links = [href for href in links if href not in checkpoint]
+
+workers = ThreadPoolExecutor(max_workers=8)
+# map keeps page order, so the checkpoint (and the final json) lists sets the way the index does
+for href, (name, rows) in workers.map(fetch_set, links):
+    name = name.strip()
     name = re.sub(' +', ' ', name)
     for n in [1,2,3]:
         rn = 'R' + str(n)
@@ -242,23 +280,11 @@ for link in links:
     name = 'GMK ' + name
     if name not in keycaps:
         name = '**' + name
-    
 
-    info = root.findall(".//table")
-    def predicate(table):
-        headers = table.findall(".//thead/tr/th")
-        return len(headers) == 3 and len([h for h in headers if "price" in h.text.lower()]) == 0
-    tables = [t for t in info if predicate(t)]
-    if len(tables) != 1:
-        kc_data[name] = '***'
-        continue
-    table = tables[0]
-    header = table.findall('.//thead/tr/th')
-    if header[1].text.strip().lower() != 'base color' or header[2].text.strip().lower() != 'legend color':
-        kc_data[name] = '***'
+    if rows is None:
+        checkpoint.append(href, [name, '***'])
         continue
 
-    rows = table.findall('.//tbody/tr')
     alphasKc = '**'
     alphasLegends = '**'
     modsKc = '**'
@@ -266,39 +292,11 @@ for link in links:
     others = {}
 
     def to_color(c):
-        lower = c.lower()
-        if 'pantone' in lower:
-            num = lower[lower.find('pantone')+len('pantone'):]
-            ni = -1
-            for i in range(len(num)):
-                if num[i].isdigit():
-                    ni = i
-
-            if ni != -1:
-                num = num[:ni+1]
-            num = num.strip()
-            num = re.sub(' +', ' ', num)
-            c = 'Pantone ' + num
-        elif 'c' == lower[-1]:
-            nospace = ''.join(c.split(' '))
-            num = nospace[:-1]
-            try:
-                num = float(num)
-                c = 'Pantone ' + str(num)
-            except:
-                pass
-        elif 'ral' in lower:
-            nums = lower[lower.find('ral')+len('ral'):]
-            nums = ''.join([c for c in nums if c.isdigit() or c == ' ']).strip()
-            nums = re.sub(' +', ' ', nums)
-            c = 'RAL ' + nums
-
-        return colors.get(c, '@@ ' + c)
-
-    for row in rows:
-        head = row[0].text.strip()
-        kc = row[1].text.strip()
-        legends = row[2].text.strip()
+        # hex codes resolve to themselves, so only names no library knows are left marked with '@@'
+        match = resolver.resolve(c)
+        return match.rgb if match else '@@ ' + c
+
+    for head, kc, legends in rows:
         kc = to_color(kc)
         legends = to_color(legends)
         if head == 'Alpha':
@@ -310,7 +308,7 @@ for link in links:
         else:
             others['?? ' + head] = [kc, legends]
 
-    kc_data[name] = {
+    checkpoint.append(href, [name, {
         'font': 'standard',
         'alphas': {
             'keycapColor': alphasKc,
@@ -322,15 +320,20 @@ for link in links:
         },
         'exceptions': '',
         **others
-    }
-
-    with open('keycapcolors_out.json', 'w') as f:
-        f.write(json.dumps(kc_data, indent=4))
+    }])
 
     print(name + ' done!')
 
-    
-    
-
-
-
+workers.shutdown()
+checkpoint.close()
+print(cache.stats())
+kc_data = dict(checkpoint.records.values())
+previous = {}
+if os.path.exists(OUT_PATH):
+    with open(OUT_PATH) as f:
+        previous = json.loads(f.read())
+changes = diff(previous, kc_data)
+write_changes(changes, changes_path(OUT_PATH))
+print(summary(changes))
+compact(kc_data, OUT_PATH)
+write_palette(encode(kc_data), palette_path(OUT_PATH))
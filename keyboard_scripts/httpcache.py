@@ -0,0 +1,96 @@
+import hashlib
+import json
+import os
+
+import requests
+
+# disk cache shared by the scrapers' fetch paths (crawler.Crawler and get() below):
+#   <root>/objects/<sha1 of body>     response bodies, stored once however many urls return them
+#   <root>/urls/<sha1 of url>.json    {"url", "body": <sha1>, "etag", "last_modified"}
+# a cached url is refetched with If-None-Match/If-Modified-Since, and a 304 reuses the stored body.
+# in offline mode nothing touches the network: cached pages are replayed and anything else is an error
+DEFAULT_ROOT = '.http_cache'
+
+
+class CacheMiss(Exception):
+    pass
+
+
+class HttpCache:
+    def __init__(self, root=DEFAULT_ROOT, offline=False):
+        self.root = root
+        self.offline = offline
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(root, 'objects'), exist_ok=True)
+        os.makedirs(os.path.join(root, 'urls'), exist_ok=True)
+
+    def _url_path(self, url):
+        return os.path.join(self.root, 'urls', hashlib.sha1(url.encode()).hexdigest() + '.json')
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, 'objects', digest)
+
+    def lookup(self, url):
+        path = self._url_path(url)
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            return json.loads(f.read())
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry is not None:
+            if entry.get('etag'):
+                headers['If-None-Match'] = entry['etag']
+            if entry.get('last_modified'):
+                headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def body(self, entry):
+        self.hits += 1
+        with open(self._object_path(entry['body']), encoding='utf-8') as f:
+            return f.read()
+
+    def offline_body(self, url):
+        entry = self.lookup(url)
+        if entry is None:
+            raise CacheMiss(f'{url} is not cached')
+        return self.body(entry)
+
+    def store(self, url, text, headers):
+        self.misses += 1
+        data = text.encode('utf-8')
+        digest = hashlib.sha1(data).hexdigest()
+        object_path = self._object_path(digest)
+        if not os.path.exists(object_path):
+            _write_atomic(object_path, data)
+        entry = {
+            'url': url,
+            'body': digest,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified')
+        }
+        _write_atomic(self._url_path(url), json.dumps(entry).encode())
+
+    def get(self, url, session=requests):
+        # blocking fetch for the synchronous scripts
+        if self.offline:
+            return self.offline_body(url)
+        entry = self.lookup(url)
+        resp = session.get(url, headers=self.conditional_headers(entry))
+        if resp.status_code == 304 and entry is not None:
+            return self.body(entry)
+        resp.raise_for_status()
+        self.store(url, resp.text, resp.headers)
+        return resp.text
+
+    def stats(self):
+        return f'{self.hits} pages from cache, {self.misses} downloaded'
+
+
+def _write_atomic(path, data):
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
@@ -0,0 +1,383 @@
+import argparse
+import io
+import json
+import os
+import re
+import sqlite3
+from collections import namedtuple
+
+# loads scraper output into the tables of server/db/init.sql:
+#   keycap sets (keycaps_out2.json)        -> keycap_sets + keycap_colors
+#   cases                                  -> cases + case_colors
+#   keycapsInfo.json-shaped colorways      -> keycaps_info
+#   keyboardInfo.json                      -> keyboard_info
+# any of these can also be a scrapediff.py changes file, in which case only the inserted and updated
+# records are loaded and deleted ones are removed (items by the same key scrapediff.py gives them: the
+# link, or the name for items without one; colorways and layouts by name).
+# every row is checked against the column types, lengths, NOT NULLs, CHECK (... IN ...) lists and
+# enums read from init.sql itself, and rows that fail are reported and left out. everything else goes
+# in within one transaction: on postgres through COPY into temporary staging tables followed by one
+# INSERT ... ON CONFLICT upsert per table, on sqlite (the local stand-in) through executemany upserts
+SCHEMA_PATH = '../server/db/init.sql'
+
+Column = namedtuple('Column', ['name', 'type', 'length', 'not_null', 'choices'])
+
+# item files use the client's display names as keys ('Base Price', 'Form Factor'), see displayName
+# in client/src/utils/shared.ts
+DISPLAY_NAMES = {
+    'price': 'Base Price',
+    'act_dist': 'Actuation Distance',
+    'bot_dist': 'Bottom-out Distance',
+    'hot_swap': 'Hot-swap'
+}
+
+# parent table -> (child table, key in the item record, how one entry becomes child columns)
+COLLECTIONS = {
+    'keycap_sets': ('keycap_colors', 'Colors', lambda c: {'color': c}),
+    'cases': ('case_colors', 'Colors', lambda c: {
+        'color': c.get('Color'),
+        'color_arr': c.get('Color Arr'),
+        'extra_price': c.get('Extra Price', 0.0)
+    })
+}
+
+# colorway sets still holding scraper placeholders are not ready for the site
+PLACEHOLDERS = ('**', '@@', '??')
+KEYCAPS_INFO_KEYS = {'font': str, 'alphas': dict, 'mods': dict, 'accents': list, 'exceptions': list, 'extras': list}
+
+
+def display_name(column):
+    return DISPLAY_NAMES.get(column) or ' '.join(w.capitalize() for w in column.split('_'))
+
+
+def load_schema(path=SCHEMA_PATH):
+    # {table: {column: Column}} from the CREATE TYPE / CREATE TABLE statements
+    with open(path) as f:
+        sql = f.read()
+
+    enums = {name: re.findall(r"'([^']*)'", values)
+             for name, values in re.findall(r'CREATE TYPE (?:IF NOT EXISTS )?(\w+) AS ENUM \(([^)]*)\)', sql)}
+
+    tables = {}
+    for table, body in re.findall(r'CREATE TABLE IF NOT EXISTS (\w+) \((.*?)\n\);', sql, re.S):
+        columns = {}
+        for line in body.split('\n'):
+            line = line.strip().rstrip(',')
+            m = re.match(r'(\w+)\s+(\w+)\s*(?:\((\d+)\))?(\[\])?(.*)', line)
+            if not m or m.group(1) in ('PRIMARY', 'FOREIGN'):
+                continue
+            name, sql_type, length, array, rest = m.groups()
+            sql_type = sql_type.upper() + (array or '')
+            choices = enums.get(sql_type.lower())
+            check = re.search(r'CHECK \(\w+ IN \(([^)]*)\)\)', rest)
+            if check:
+                choices = re.findall(r"'([^']*)'", check.group(1))
+            columns[name] = Column(name, sql_type, int(length) if length else None,
+                                   'NOT NULL' in rest or 'PRIMARY KEY' in rest, choices)
+        tables[table] = columns
+    return tables
+
+
+def check_value(column, value):
+    if value is None:
+        return f'{column.name} is required' if column.not_null else None
+    if column.type in ('FLOAT', 'INT'):
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return f'{column.name} should be a number, got {value!r}'
+        if column.type == 'INT' and value != int(value):
+            return f'{column.name} should be a whole number, got {value!r}'
+    elif column.type == 'FLOAT[]':
+        if not isinstance(value, list) or not all(isinstance(v, (int, float)) for v in value):
+            return f'{column.name} should be a list of numbers, got {value!r}'
+    elif not isinstance(value, str):
+        return f'{column.name} should be text, got {value!r}'
+    elif column.length is not None and len(value) > column.length:
+        return f'{column.name} is longer than {column.length} characters: {value!r}'
+    if column.choices is not None and value not in column.choices:
+        return f'{column.name} must be one of {", ".join(column.choices)}, got {value!r}'
+    return None
+
+
+def check_row(columns, row):
+    problems = [check_value(columns[name], row.get(name)) for name in columns if name != 'id']
+    return [p for p in problems if p]
+
+
+def item_rows(schema, table, records, status=None):
+    # (rows, {parent name: child rows}, problems) for item records keyed by display name
+    columns = [c for c in schema[table] if c != 'id']
+    child = COLLECTIONS.get(table)
+    rows = []
+    children = {}
+    problems = []
+    seen = set()
+    for record in records:
+        row = {c: record.get(display_name(c)) for c in columns}
+        if row.get('status') is None and 'status' in row:
+            row['status'] = status
+        label = f'{table} {row.get("name")!r}'
+
+        found = check_row(schema[table], row)
+        kids = []
+        if child is not None:
+            child_table, key, to_row = child
+            for entry in record.get(key) or []:
+                if entry in ('', None):
+                    continue
+                kid = to_row(entry)
+                found += check_row({c: col for c, col in schema[child_table].items() if c != 'item_id'}, kid)
+                kids.append(kid)
+        if row.get('name') in seen:
+            found.append('listed more than once, the first one is kept')
+        if found:
+            problems += [f'{label}: {p}' for p in found]
+            continue
+        seen.add(row['name'])
+        rows.append(row)
+        children[row['name']] = kids
+    return rows, children, problems
+
+
+def info_rows(schema, table, sets, require_keycaps_shape=False):
+    # keycaps_info / keyboard_info rows: {name, data} with data stored as json text
+    rows = []
+    problems = []
+    for name, data in sets.items():
+        found = []
+        if require_keycaps_shape:
+            if not isinstance(data, dict):
+                found.append(f'no colorway data ({data!r})')
+            else:
+                found += [f'{key} should be a {kind.__name__}' for key, kind in KEYCAPS_INFO_KEYS.items()
+                          if not isinstance(data.get(key), kind)]
+        text = json.dumps(data)
+        if any(p in name or p in text for p in PLACEHOLDERS):
+            found.append('still has scraper placeholders (**, @@ or ??)')
+        row = {'name': name, 'data': text}
+        found += check_row(schema[table], row)
+        if found:
+            problems += [f'{table} {name!r}: {p}' for p in found]
+        else:
+            rows.append(row)
+    return rows, problems
+
+
+class SqliteTarget:
+    # throwaway stand-in for the postgres database, created from the same init.sql
+    def __init__(self, path, schema_path=SCHEMA_PATH):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        with open(schema_path) as f:
+            sql = f.read()
+        enums = dict(re.findall(r'CREATE TYPE (?:IF NOT EXISTS )?(\w+) AS ENUM (\([^)]*\))', sql))
+        sql = re.sub(r'CREATE TYPE[^;]*;', '', sql)
+        sql = sql.replace('SERIAL PRIMARY KEY', 'INTEGER PRIMARY KEY').replace('FLOAT[]', 'TEXT')
+        for name, values in enums.items():
+            sql = re.sub(rf'(\w+)(\s+){name}\b', rf'\1\2TEXT CHECK (\1 IN {values})', sql)
+        self.conn.executescript(sql)
+
+    def __enter__(self):
+        self.conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self.conn.__exit__(*exc)
+
+    @staticmethod
+    def _value(v):
+        return json.dumps(v) if isinstance(v, list) else v
+
+    def upsert(self, table, columns, rows, key):
+        updates = ', '.join(f'{c} = excluded.{c}' for c in columns if c != key)
+        self.conn.executemany(
+            f'INSERT INTO {table} ({", ".join(columns)}) VALUES ({", ".join("?" for _ in columns)}) '
+            f'ON CONFLICT ({key}) DO UPDATE SET {updates}',
+            [[self._value(row[c]) for c in columns] for row in rows])
+
+    def ids(self, table, names):
+        found = {}
+        names = list(names)
+        for i in range(0, len(names), 500):
+            chunk = names[i:i + 500]
+            found.update(self.conn.execute(
+                f'SELECT name, id FROM {table} WHERE name IN ({", ".join("?" for _ in chunk)})', chunk))
+        return found
+
+    def ids_by_key(self, table, keys):
+        return [i for key in keys for (i,) in self.conn.execute(
+            f"SELECT id FROM {table} WHERE link = ? OR (COALESCE(link, '') = '' AND name = ?)", [key, key])]
+
+    def delete(self, table, column, values):
+        self.conn.executemany(f'DELETE FROM {table} WHERE {column} = ?', [[v] for v in values])
+
+    def replace_children(self, table, columns, rows, item_ids):
+        self.conn.executemany(f'DELETE FROM {table} WHERE item_id = ?', [[i] for i in item_ids])
+        if not rows:
+            return
+        self.conn.executemany(
+            f'INSERT INTO {table} (item_id, {", ".join(columns)}) VALUES (?, {", ".join("?" for _ in columns)})',
+            [[row['item_id']] + [self._value(row[c]) for c in columns] for row in rows])
+
+    def close(self):
+        self.conn.close()
+
+
+class PostgresTarget:
+    def __init__(self, dsn):
+        # only needed when actually loading into postgres
+        import psycopg2
+        self.conn = psycopg2.connect(dsn)
+        self.cur = self.conn.cursor()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc):
+        # psycopg2 already runs everything in one transaction until commit
+        if exc_type is None:
+            self.conn.commit()
+        else:
+            self.conn.rollback()
+
+    @staticmethod
+    def _copy_value(v):
+        if v is None:
+            return '\\N'
+        if isinstance(v, list):
+            v = '{' + ','.join(repr(float(x)) for x in v) + '}'
+        return str(v).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+    def _copy(self, table, columns, rows):
+        stage = f'stage_{table}'
+        self.cur.execute(f'CREATE TEMP TABLE {stage} ON COMMIT DROP AS '
+                         f'SELECT {", ".join(columns)} FROM {table} WITH NO DATA')
+        buf = io.StringIO()
+        for row in rows:
+            buf.write('\t'.join(self._copy_value(row[c]) for c in columns) + '\n')
+        buf.seek(0)
+        self.cur.copy_expert(f'COPY {stage} ({", ".join(columns)}) FROM STDIN', buf)
+        return stage
+
+    def upsert(self, table, columns, rows, key):
+        stage = self._copy(table, columns, rows)
+        updates = ', '.join(f'{c} = EXCLUDED.{c}' for c in columns if c != key)
+        self.cur.execute(f'INSERT INTO {table} ({", ".join(columns)}) SELECT {", ".join(columns)} FROM {stage} '
+                         f'ON CONFLICT ({key}) DO UPDATE SET {updates}')
+
+    def ids(self, table, names):
+        self.cur.execute(f'SELECT name, id FROM {table} WHERE name = ANY(%s)', (list(names),))
+        return dict(self.cur.fetchall())
+
+    def ids_by_key(self, table, keys):
+        keys = list(keys)
+        self.cur.execute(f"SELECT id FROM {table} WHERE link = ANY(%s) OR (COALESCE(link, '') = '' AND name = ANY(%s))",
+                         (keys, keys))
+        return [i for (i,) in self.cur.fetchall()]
+
+    def delete(self, table, column, values):
+        self.cur.execute(f'DELETE FROM {table} WHERE {column} = ANY(%s)', (list(values),))
+
+    def replace_children(self, table, columns, rows, item_ids):
+        self.cur.execute(f'DELETE FROM {table} WHERE item_id = ANY(%s)', (list(item_ids),))
+        if not rows:
+            return
+        stage = self._copy(table, ['item_id'] + columns, rows)
+        self.cur.execute(f'INSERT INTO {table} (item_id, {", ".join(columns)}) '
+                         f'SELECT item_id, {", ".join(columns)} FROM {stage} ON CONFLICT DO NOTHING')
+
+    def close(self):
+        self.cur.close()
+        self.conn.close()
+
+
+def load_items(target, schema, table, rows, children):
+    columns = [c for c in schema[table] if c != 'id']
+    target.upsert(table, columns, rows, 'name')
+    if table in COLLECTIONS and rows:
+        child_table = COLLECTIONS[table][0]
+        ids = target.ids(table, [row['name'] for row in rows])
+        child_columns = [c for c in schema[child_table] if c != 'item_id']
+        child_rows = []
+        for name, kids in children.items():
+            # the same color listed twice would break the (item_id, color) primary key
+            unique = {kid['color']: kid for kid in kids}
+            child_rows += [{'item_id': ids[name], **kid} for kid in unique.values()]
+        target.replace_children(child_table, child_columns, child_rows, ids.values())
+
+
+def delete_items(target, table, keys):
+    # keys are scrapediff.record_key values, so an item without a link is deleted by its name
+    child = COLLECTIONS.get(table)
+    ids = target.ids_by_key(table, keys)
+    if child is not None and ids:
+        target.replace_children(child[0], [], [], ids)
+    target.delete(table, 'id', ids)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.loads(f.read())
+
+
+def split_changes(data, as_dict):
+    # (records to load, keys to delete) for a snapshot or a scrapediff.py changes file
+    if not (isinstance(data, dict) and set(data) == {'insert', 'update', 'delete'}):
+        return data, []
+    records = data['insert'] + [update['record'] for update in data['update']]
+    if as_dict:
+        records = dict(records)
+    return records, data['delete']
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='validate scraper output and bulk load it into the site database')
+    parser.add_argument('--keycaps', help='keycap set items, e.g. keycaps_out2.json')
+    parser.add_argument('--cases', help='case items with a Colors list of {Color, Color Arr, Extra Price}')
+    parser.add_argument('--keycaps-info', help='colorways, e.g. ../server/assets/keycapsInfo.json')
+    parser.add_argument('--keyboard-info', help='layouts, e.g. ../server/assets/keyboardInfo.json')
+    parser.add_argument('--status', default='Group Buy - Closed', help='status for items that have none')
+    parser.add_argument('--dsn', default=os.environ.get('DATABASE_URL'), help='postgres connection string')
+    parser.add_argument('--sqlite', help='load into this sqlite file instead of postgres')
+    parser.add_argument('--strict', action='store_true', help='load nothing if any record is invalid')
+    parser.add_argument('--schema', default=SCHEMA_PATH)
+    args = parser.parse_args()
+
+    schema = load_schema(args.schema)
+    problems = []
+    items = []
+    infos = []
+    for path, table in ((args.keycaps, 'keycap_sets'), (args.cases, 'cases')):
+        if path:
+            records, deleted = split_changes(read_json(path), False)
+            rows, children, found = item_rows(schema, table, records, args.status)
+            items.append((table, rows, children, deleted))
+            problems += found
+    for path, table in ((args.keycaps_info, 'keycaps_info'), (args.keyboard_info, 'keyboard_info')):
+        if path:
+            records, deleted = split_changes(read_json(path), True)
+            rows, found = info_rows(schema, table, records, table == 'keycaps_info')
+            infos.append((table, rows, deleted))
+            problems += found
+
+    for problem in problems:
+        print('skipped: ' + problem)
+    if problems and args.strict:
+        raise SystemExit(f'{len(problems)} invalid records, nothing loaded')
+
+    if args.sqlite:
+        target = SqliteTarget(args.sqlite, args.schema)
+    elif args.dsn:
+        target = PostgresTarget(args.dsn)
+    else:
+        raise SystemExit('give --dsn (or set DATABASE_URL) or --sqlite')
+
+    with target:
+        for table, rows, children, deleted in items:
+            delete_items(target, table, deleted)
+            load_items(target, schema, table, rows, children)
+            print(f'{table}: {len(rows)} rows loaded, {len(deleted)} deleted')
+        for table, rows, deleted in infos:
+            target.delete(table, 'name', deleted)
+            target.upsert(table, ['name', 'data'], rows, 'name')
+            print(f'{table}: {len(rows)} rows loaded, {len(deleted)} deleted')
+    target.close()
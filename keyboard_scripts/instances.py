@@ -0,0 +1,176 @@
+import argparse
+import json
+import os
+import re
+import struct
+
+import numpy as np
+
+from keycapmodels import ACCENTS, ALPHAS, STAB_OFFSETS, key_size, keycap_model
+
+# precomputes what KeyboardRender.loadKeyboard works out on every load: which model each key uses,
+# where it goes and which colorway slot colors it. one file per keyboard (all little-endian):
+#   header: magic 'KBDI', u16 version, u16 model count, u32 instance count
+#   model table: u8 name length + utf-8 name per model (keycap models plus 'switch' and 'stabilizer')
+#   padding to 4 bytes
+#   instances: u16 model index, u8 slot, u8 key index, f32 model matrix[16] (column-major, as gl-matrix)
+#   key table: u8 name length + utf-8 name per key, in the order key indices refer to
+# keycap instances come first in layout order, followed by every switch and stabilizer
+MAGIC = b'KBDI'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+INSTANCE = struct.Struct('<HBB16f')
+
+SLOT_ALPHA = 0
+SLOT_MOD = 1
+SLOT_SWITCH = 2
+SLOT_STABILIZER = 3
+# keycapsInfo exceptions override the alpha/mod slot; slot = SLOT_EXCEPTION + index into exceptions
+SLOT_EXCEPTION = 16
+# set on accent keys: the set's accent colors, if it has any, come before the slot above
+SLOT_ACCENT_FLAG = 0x80
+
+KEY_HEIGHT = 1.25
+
+DEFAULT_KEYBOARD_INFO = '../server/assets/keyboardInfo.json'
+DEFAULT_KEYCAPS_INFO = '../server/assets/keycapsInfo.json'
+DEFAULT_MODELS = '../server/assets/models/keycaps'
+DEFAULT_OUT = '../server/assets/instances'
+
+
+def _translation(x, y, z):
+    mat = np.eye(4)
+    mat[:3, 3] = (x, y, z)
+    return mat
+
+
+def _rotation_x(degrees):
+    ang = np.radians(degrees)
+    mat = np.eye(4)
+    mat[1:3, 1:3] = [[np.cos(ang), -np.sin(ang)], [np.sin(ang), np.cos(ang)]]
+    return mat
+
+
+def color_slot(key, exceptions=()):
+    # same precedence as KeyboardRender.getKeycapColorOptions
+    accent = SLOT_ACCENT_FLAG if key in ACCENTS else 0
+    for i, exception in enumerate(exceptions):
+        if key in exception['keys']:
+            return accent | (SLOT_EXCEPTION + i)
+    return accent | (SLOT_ALPHA if key in ALPHAS else SLOT_MOD)
+
+
+def layout(keyboard_info, exceptions=()):
+    # returns [(key, model, slot, 4x4 matrix)], same math as KeyboardRender.loadKeyboard
+    groups = keyboard_info['keyGroups']
+    num_units_x = max(kg['offset'][0] + sum(key_size(k) for k in kg['keys']) for kg in groups)
+    num_units_y = max(kg['offset'][1] for kg in groups) + 1
+    height_incline = _translation(0, KEY_HEIGHT, 0) @ _rotation_x(keyboard_info['incline'])
+
+    keycaps = []
+    others = []
+    for kg in groups:
+        x = kg['offset'][0] - num_units_x / 2
+        z = kg['offset'][1] - num_units_y / 2 + 0.5
+        for key in kg['keys']:
+            size = key_size(key)
+            transform = height_incline @ _translation(x + size / 2, 0, z)
+            keycaps.append((key, keycap_model(key, kg['row']), color_slot(key, exceptions), transform))
+
+            others.append((key, 'switch', SLOT_SWITCH, transform))
+            stab_offset = STAB_OFFSETS.get(size)
+            if stab_offset:
+                for side in (stab_offset, -stab_offset):
+                    others.append((key, 'stabilizer', SLOT_STABILIZER, _translation(side, 0, 0) @ transform))
+            x += size
+    return keycaps + others
+
+
+def _names(names):
+    return b''.join(struct.pack('<B', len(n.encode())) + n.encode() for n in names)
+
+
+def encode_instances(instances):
+    models = sorted({model for _, model, _, _ in instances})
+    keys = list(dict.fromkeys(key for key, _, _, _ in instances))
+    model_ids = {m: i for i, m in enumerate(models)}
+    key_ids = {k: i for i, k in enumerate(keys)}
+
+    head = HEADER.pack(MAGIC, VERSION, len(models), len(instances)) + _names(models)
+    head += b'\0' * (-len(head) % 4)
+    body = b''.join(INSTANCE.pack(model_ids[model], slot, key_ids[key], *transform.T.ravel())
+                    for key, model, slot, transform in instances)
+    return head + body + _names(keys)
+
+
+def decode_instances(buf):
+    magic, version, num_models, num_instances = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('not an instance table')
+    if version != VERSION:
+        raise ValueError(f'unsupported instance table version {version}')
+
+    def names(pos, count):
+        out = []
+        for _ in range(count):
+            length = buf[pos]
+            out.append(bytes(buf[pos + 1:pos + 1 + length]).decode())
+            pos += 1 + length
+        return out, pos
+
+    models, pos = names(HEADER.size, num_models)
+    pos += -pos % 4
+    records = [INSTANCE.unpack_from(buf, pos + i * INSTANCE.size) for i in range(num_instances)]
+    keys, _ = names(pos + num_instances * INSTANCE.size, max((r[2] for r in records), default=-1) + 1)
+    return [(keys[r[2]], models[r[0]], r[1], np.array(r[3:]).reshape(4, 4).T) for r in records]
+
+
+def slug(name):
+    return re.sub('[^a-z0-9]+', '_', name.lower()).strip('_')
+
+
+def missing_models(instances, model_dir):
+    available = {os.path.splitext(f)[0] for f in os.listdir(model_dir)}
+    return sorted({model for _, model, slot, _ in instances
+                   if slot not in (SLOT_SWITCH, SLOT_STABILIZER) and model not in available})
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='precompute per-keyboard keycap/switch/stabilizer instance tables')
+    parser.add_argument('--keyboard-info', default=DEFAULT_KEYBOARD_INFO)
+    parser.add_argument('--profile', default='cherry', help='keycap profile whose model catalog is checked')
+    parser.add_argument('--models', default=DEFAULT_MODELS)
+    parser.add_argument('--keycaps', help='keycap set name in keycapsInfo.json whose exceptions get their own slots')
+    parser.add_argument('--keycaps-info', default=DEFAULT_KEYCAPS_INFO)
+    parser.add_argument('--out', default=DEFAULT_OUT)
+    args = parser.parse_args()
+
+    with open(args.keyboard_info) as f:
+        keyboards = json.loads(f.read())
+    exceptions = ()
+    if args.keycaps:
+        with open(args.keycaps_info) as f:
+            exceptions = json.loads(f.read())[args.keycaps]['exceptions']
+
+    os.makedirs(args.out, exist_ok=True)
+    written = set()
+    for name, info in keyboards.items():
+        instances = layout(info, exceptions)
+        missing = missing_models(instances, os.path.join(args.models, args.profile))
+        if missing:
+            print(f'{name}: no {args.profile} model for {", ".join(missing)}')
+
+        base = slug(name)
+        if args.keycaps:
+            base += '.' + slug(args.keycaps)
+        # names that only differ in punctuation would otherwise overwrite each other
+        file_name, n = base, 1
+        while file_name in written:
+            n += 1
+            file_name = f'{base}_{n}'
+        written.add(file_name)
+
+        out_path = os.path.join(args.out, f'{file_name}.instances.bin')
+        with open(out_path, 'wb') as f:
+            f.write(encode_instances(instances))
+        print(f'{name} -> {out_path}: {len(instances)} instances')
@@ -0,0 +1,74 @@
+def keycap_name(obj_name):
+    # blender object names look like 'R1_1_25U_Plane.003' or 'Space6_25_Plane.001'
+    if obj_name[0] == 'R':
+        row = obj_name[1]
+        units = obj_name[3:obj_name.index('U')]
+        return f'R{row}_{units}U'
+    return obj_name[:obj_name.index('_Plane')]
+
+
+# the tables below mirror client/src/utils/keyboardComponents.ts and the stabilizer offsets in
+# KeyboardRender.tsx; keep them in sync when keys are added there
+
+SPECIAL_NUM_UNITS = {
+    'Backspace': 2,
+    'Tab': 1.5,
+    'Backslash': 1.5,
+    'Caps': 1.75,
+    'ANSIEnter': 2.25,
+    'LShift': 2.25,
+    'RShift1_75': 1.75,
+    'RShift2_75': 2.75,
+    'LCtrl1_25': 1.25,
+    'LWin1_25': 1.25,
+    'LAlt1_25': 1.25,
+    'LCtrl1_5': 1.5,
+    'LWin1_5': 1.5,
+    'LAlt1_5': 1.5,
+    'RCtrl1_25': 1.25,
+    'RWin1_25': 1.25,
+    'RAlt1_25': 1.25,
+    'RCtrl1_5': 1.5,
+    'RWin1_5': 1.5,
+    'RAlt1_5': 1.5,
+    'Fn1_25': 1.25,
+    'Fn1_5': 1.5,
+    'Space6': 6,
+    'Space6_25': 6.25,
+    'Space7': 7,
+    'Num0': 2
+}
+
+SPECIAL_KEYCAP_IDENTIFIERS = {'Space6_25', 'Space6', 'Space7', 'NumEnter', 'NumPlus', 'ISOEnter'}
+
+ALPHAS = {
+    'F1', 'F2', 'F3', 'F4', 'F9', 'F10', 'F11', 'F12',
+    'Tilde', '1', '2', '3', '4', '5', '6', '7', '8', '9', '0', 'Minus', 'Equals',
+    'Q', 'W', 'E', 'R', 'T', 'Y', 'U', 'I', 'O', 'P', 'OSqr', 'CSqr', 'Backslash',
+    'A', 'S', 'D', 'F', 'G', 'H', 'J', 'K', 'L', 'Semicolon', 'Apostrophe',
+    'Z', 'X', 'C', 'V', 'B', 'N', 'M', 'Comma', 'Period', 'Forwardslash', 'Space6', 'Space6_25', 'Space7',
+    'Num0', 'Num1', 'Num2', 'Num3', 'Num4', 'Num5', 'Num6', 'Num7', 'Num8', 'Num9', 'NumPoint'
+}
+
+ACCENTS = {'Esc', 'ANSIEnter', 'ISOEnter', 'NumEnter'}
+
+# distance of each stabilizer from the key center, by key width
+STAB_OFFSETS = {
+    2: 0.65,
+    2.25: 0.65,
+    2.75: 0.65,
+    6: 2.5,
+    6.25: 2.5,
+    7: 2.5
+}
+
+
+def key_size(key):
+    return SPECIAL_NUM_UNITS.get(key, 1)
+
+
+def keycap_model(key, row):
+    # 'Space6_25' and friends have their own model, everything else is picked by row and width
+    if key in SPECIAL_KEYCAP_IDENTIFIERS:
+        return key
+    return f'R{row}_' + f'{key_size(key):g}'.replace('.', '_') + 'U'
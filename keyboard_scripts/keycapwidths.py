@@ -0,0 +1,378 @@
+import argparse
+import base64
+import glob
+import json
+import os
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from meshformat import read_mesh, write_mesh
+
+# a profile's wider keycaps are its narrow ones stretched along one axis, so only the narrowest
+# cap of each shape ("base") has to be stored as a mesh. every other model becomes an entry in
+# <profile dir>/.widths.json (a dotfile, like the build manifest, so globs over
+# model files skip it):
+#   {"version": 1, "tolerance": <model units>, "uv_tolerance": <uv units>,
+#    "bases": [<model name>, ...],
+#    "models": {<model name>: {"base": <model name>, "axis": 0 | 2, "split": [lo, hi],
+#                              "extend": [neg, pos], "uv": [[4 floats], [4 floats]] | null,
+#                              "uv_residual": <base64 of little-endian i16 (du, dv) pairs> | null,
+#                              "error": <distance>, "uv_error": <uv units>}}}
+# to rebuild a model, every base vertex below split[0] on the axis moves by -extend[0], every one
+# above split[1] by +extend[1], and the ones in between are stretched linearly between the two
+# (lo == hi just pulls the two halves apart and stretches the triangles that cross the gap).
+# keycaps are unwrapped per model, so legend-face uvs can't be stretched with the geometry.
+# instead they come from a planar map of the position, uv = M @ [x, y, z, 1], fitted to the real
+# model. where the real unwrap isn't planar enough for that, uv_residual holds the correction for
+# every base legend-face vertex, in vertex order and in steps of UV_RESIDUAL_STEP. vertices off the legend face keep the base's uvs.
+# error is the largest distance between the two surfaces, checked both ways at every vertex,
+# edge midpoint and triangle centroid. uv_error is the worst miss of the rebuilt legend-face uvs
+# against the real model's uvs at the same spots
+VERSION = 1
+MODEL_DIR = '../server/assets/models/keycaps/cherry'
+TABLE_NAME = '.widths.json'
+TOLERANCE = 0.02
+# a legend pixel on a 512 pixel texture is 0.002, so this keeps legends within a few pixels
+UV_TOLERANCE = 0.01
+UV_RESIDUAL_STEP = 1e-5
+# vertices facing up at least this much are on the legend face
+LEGEND_FACE_NORMAL_Y = 0.7
+AXES = (0, 2)
+# candidate split positions tried per side when fitting
+SPLIT_CANDIDATES = 12
+
+
+def stretch(mesh, axis, split, extend):
+    lo, hi = split
+    neg, pos = extend
+    verts = np.asarray(mesh['vertices'], dtype=np.float64).copy()
+    normals = np.asarray(mesh['normals'], dtype=np.float64).copy()
+    t = verts[:, axis]
+    moved = np.where(t < lo, t - neg, np.where(t > hi, t + pos, t))
+    if hi > lo:
+        middle = (t >= lo) & (t <= hi)
+        scale = (hi - lo + neg + pos) / (hi - lo)
+        moved[middle] = lo - neg + (t[middle] - lo) * scale
+        # normals take the inverse transpose of the stretch
+        normals[middle, axis] /= scale
+        normals[middle] /= np.linalg.norm(normals[middle], axis=1, keepdims=True)
+    verts[:, axis] = moved
+    out = dict(mesh)
+    out['vertices'] = verts.astype(np.float32)
+    out['normals'] = normals.astype(np.float32)
+    return out
+
+
+def legend_face(mesh):
+    uvs = mesh.get('uvs')
+    if uvs is None:
+        return np.zeros(len(mesh['vertices']), dtype=bool)
+    return (np.asarray(mesh['normals'])[:, 1] > LEGEND_FACE_NORMAL_Y) & np.asarray(uvs).any(axis=1)
+
+
+def fit_uv_map(mesh):
+    # (2x4 matrix, worst miss) of the planar uv map on the legend face, None if there is no face
+    face = legend_face(mesh)
+    if face.sum() < 4:
+        return None, 0.0
+    points = np.c_[np.asarray(mesh['vertices'], dtype=np.float64)[face], np.ones(face.sum())]
+    uvs = np.asarray(mesh['uvs'], dtype=np.float64)[face]
+    matrix = np.linalg.lstsq(points, uvs, rcond=None)[0].T
+    return matrix, float(np.abs(points @ matrix.T - uvs).max())
+
+
+def sample_legend_uvs(mesh, points):
+    # the model's legend-face uvs at points on (or next to) that face. the face is a height field
+    # over xz, so every point takes the uv of the legend triangle under it, barycentric in xz;
+    # points just off the face's edge use the triangle they are closest to falling into
+    face = legend_face(mesh)
+    tris = np.asarray(mesh['triangles'])
+    tris = tris[face[tris].all(axis=1)]
+    xz = np.asarray(mesh['vertices'], dtype=np.float64)[:, [0, 2]]
+    a, b, c = (xz[tris[:, k]][None] for k in range(3))
+    p = np.asarray(points, dtype=np.float64)[:, None, [0, 2]]
+    v0, v1, v2 = b - a, c - a, p - a
+    det = v0[..., 0] * v1[..., 1] - v0[..., 1] * v1[..., 0]
+    det = np.where(det == 0, 1e-30, det)
+    wb = (v2[..., 0] * v1[..., 1] - v2[..., 1] * v1[..., 0]) / det
+    wc = (v0[..., 0] * v2[..., 1] - v0[..., 1] * v2[..., 0]) / det
+    weights = np.stack([1 - wb - wc, wb, wc], axis=-1)
+    best = weights.min(axis=-1).argmax(axis=1)
+    w = np.clip(weights[np.arange(len(best)), best], 0, None)
+    w /= w.sum(axis=1, keepdims=True)
+    uvs = np.asarray(mesh['uvs'], dtype=np.float64)[tris[best]]
+    return (uvs * w[..., None]).sum(axis=1)
+
+
+def reconstruct(base, entry):
+    mesh = stretch(base, entry['axis'], entry['split'], entry['extend'])
+    if entry['uv'] is not None and mesh.get('uvs') is not None:
+        face = legend_face(base)
+        uvs = np.asarray(mesh['uvs'], dtype=np.float64).copy()
+        points = np.c_[np.asarray(mesh['vertices'], dtype=np.float64)[face], np.ones(face.sum())]
+        uvs[face] = points @ np.asarray(entry['uv']).T
+        if entry.get('uv_residual') is not None:
+            residual = np.frombuffer(base64.b64decode(entry['uv_residual']), dtype='<i2').reshape(-1, 2)
+            uvs[face] += residual * UV_RESIDUAL_STEP
+        mesh['uvs'] = uvs.astype(np.float32)
+    return mesh
+
+
+def rebuilt_uv_error(base, rebuilt, model):
+    # worst miss of a rebuilt model's legend-face uvs against the real model's at the same spots
+    face = legend_face(base)
+    if rebuilt.get('uvs') is None or not face.any() or not legend_face(model).any():
+        return 0.0
+    expected = sample_legend_uvs(model, np.asarray(rebuilt['vertices'])[face])
+    return float(np.abs(np.asarray(rebuilt['uvs'], dtype=np.float64)[face] - expected).max())
+
+
+def _closest_distances(points, a, b, c):
+    # distance from every point to every triangle (points x triangles), ericson's closest point test
+    p = points[:, None, :]
+    ab, ac = b - a, c - a
+    ap, bp, cp = p - a, p - b, p - c
+    d1, d2 = (ab * ap).sum(-1), (ac * ap).sum(-1)
+    d3, d4 = (ab * bp).sum(-1), (ac * bp).sum(-1)
+    d5, d6 = (ab * cp).sum(-1), (ac * cp).sum(-1)
+    va, vb, vc = d3 * d6 - d5 * d4, d5 * d2 - d1 * d6, d1 * d4 - d3 * d2
+
+    def safe(x):
+        return np.where(x == 0, 1e-30, x)
+
+    denom = safe(va + vb + vc)
+    closest = a + ab * (vb / denom)[..., None] + ac * (vc / denom)[..., None]
+    # later regions win, in order: edges, then vertices
+    regions = [
+        ((va <= 0) & (d4 >= d3) & (d5 >= d6), b + (c - b) * ((d4 - d3) / safe(d4 - d3 + d5 - d6))[..., None]),
+        ((vb <= 0) & (d2 >= 0) & (d6 <= 0), a + ac * (d2 / safe(d2 - d6))[..., None]),
+        ((vc <= 0) & (d1 >= 0) & (d3 <= 0), a + ab * (d1 / safe(d1 - d3))[..., None]),
+        ((d6 >= 0) & (d5 <= d6), c + 0 * closest),
+        ((d3 >= 0) & (d4 <= d3), b + 0 * closest),
+        ((d1 <= 0) & (d2 <= 0), a + 0 * closest)
+    ]
+    for mask, point in regions:
+        closest = np.where(mask[..., None], point, closest)
+    return np.linalg.norm(p - closest, axis=-1)
+
+
+def _probes(mesh):
+    verts = np.asarray(mesh['vertices'], dtype=np.float64)
+    corners = verts[np.asarray(mesh['triangles'])]
+    midpoints = [(corners[:, i] + corners[:, (i + 1) % 3]) / 2 for i in range(3)]
+    return np.concatenate([verts, corners.mean(axis=1), *midpoints])
+
+
+def surface_distance(points, mesh, chunk=64):
+    # distance from every point to the closest point on the mesh surface. points go in spatially
+    # sorted chunks, and a chunk is only tested against triangles whose bounding box is no farther
+    # away than the chunk's worst nearest-vertex distance (which the surface can only beat)
+    verts = np.asarray(mesh['vertices'], dtype=np.float64)
+    corners = verts[np.asarray(mesh['triangles'])]
+    tri_lo, tri_hi = corners.min(axis=1), corners.max(axis=1)
+    nearest_vertex = cKDTree(verts).query(points)[0]
+    order = np.lexsort(np.round(points / 0.05).T)
+    out = np.empty(len(points))
+    for i in range(0, len(points), chunk):
+        idx = order[i:i + chunk]
+        p = points[idx]
+        gap = np.maximum(0, np.maximum(tri_lo - p.max(axis=0), p.min(axis=0) - tri_hi))
+        near = np.linalg.norm(gap, axis=1) <= nearest_vertex[idx].max()
+        c = corners[near]
+        out[idx] = _closest_distances(p, c[None, :, 0], c[None, :, 1], c[None, :, 2]).min(axis=1)
+    return out
+
+
+def mesh_distance(mesh, other):
+    # symmetric (approximate hausdorff) distance between two surfaces
+    return max(surface_distance(_probes(mesh), other).max(), surface_distance(_probes(other), mesh).max())
+
+
+def _samples(mesh, count, rng):
+    verts = np.asarray(mesh['vertices'], dtype=np.float64)
+    corners = verts[np.asarray(mesh['triangles'])]
+    areas = np.linalg.norm(np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0]), axis=1)
+    tri = rng.choice(len(corners), size=count, p=areas / areas.sum())
+    r1, r2 = rng.random(count), rng.random(count)
+    flip = r1 + r2 > 1
+    r1[flip], r2[flip] = 1 - r1[flip], 1 - r2[flip]
+    c = corners[tri]
+    return np.concatenate([verts, c[:, 0] + (c[:, 1] - c[:, 0]) * r1[:, None] + (c[:, 2] - c[:, 0]) * r2[:, None]])
+
+
+def _rough_distance(samples, tree, mesh, rng):
+    # cheap stand-in for mesh_distance while searching: mean nearest-sample distance both ways
+    other = _samples(mesh, len(samples), rng)
+    return (tree.query(other)[0].mean() + cKDTree(other).query(samples)[0].mean()) / 2
+
+
+def fit_stretch(base, target):
+    # (score, axis, split, extend) that best turns base into target, scored by _rough_distance
+    base_verts = np.asarray(base['vertices'], dtype=np.float64)
+    target_verts = np.asarray(target['vertices'], dtype=np.float64)
+    rng = np.random.default_rng(0)
+    samples = _samples(target, 4000, rng)
+    tree = cKDTree(samples)
+
+    best = None
+    for axis in AXES:
+        other_axes = [k for k in range(3) if k != axis]
+        # the other two extents have to agree already, stretching won't fix them
+        if np.abs(np.ptp(base_verts[:, other_axes], axis=0) - np.ptp(target_verts[:, other_axes], axis=0)).max() > TOLERANCE:
+            continue
+        neg = base_verts[:, axis].min() - target_verts[:, axis].min()
+        pos = target_verts[:, axis].max() - base_verts[:, axis].max()
+        if neg < -TOLERANCE or pos < -TOLERANCE or neg + pos < TOLERANCE:
+            continue
+        levels = np.unique(base_verts[:, axis])
+        middle = (levels.min() + levels.max()) / 2
+        lows = np.quantile(levels[levels <= middle], np.linspace(0.05, 1, SPLIT_CANDIDATES))
+        highs = np.quantile(levels[levels >= middle], np.linspace(0, 0.95, SPLIT_CANDIDATES))
+        for lo in lows:
+            for hi in highs:
+                if hi < lo:
+                    continue
+                candidate = stretch(base, axis, (float(lo), float(hi)), (float(neg), float(pos)))
+                score = _rough_distance(samples, tree, candidate, np.random.default_rng(1))
+                if best is None or score < best[0]:
+                    best = (score, axis, [float(lo), float(hi)], [float(neg), float(pos)])
+    return best
+
+
+def model_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def detect(meshes, tolerance=TOLERANCE, uv_tolerance=UV_TOLERANCE):
+    # narrowest first; a model that no existing base stretches into within tolerance becomes a base.
+    # the geometry always comes from the stretch; legend uvs the planar map misses by more than
+    # uv_tolerance get a per-vertex residual
+    order = sorted(meshes, key=lambda name: (float(np.ptp(np.asarray(meshes[name]['vertices'])[:, [0, 2]], axis=0).sum()), name))
+    bases = []
+    models = {}
+    for name in order:
+        target = meshes[name]
+        uv, _ = fit_uv_map(target)
+        # most promising base first; the first one within tolerance wins
+        fits = [(base_name, fit_stretch(meshes[base_name], target)) for base_name in bases]
+        fits = sorted((fit for fit in fits if fit[1] is not None), key=lambda fit: fit[1][0])
+        found = None
+        for base_name, (_, axis, split, extend) in fits:
+            base = meshes[base_name]
+            entry = {'base': base_name, 'axis': axis, 'split': split, 'extend': extend,
+                     'uv': uv.tolist() if uv is not None else None, 'uv_residual': None}
+            rebuilt = reconstruct(base, entry)
+            error = mesh_distance(rebuilt, target)
+            if error > tolerance:
+                continue
+            uv_error = rebuilt_uv_error(base, rebuilt, target)
+            if uv is not None and uv_error > uv_tolerance:
+                face = legend_face(base)
+                expected = sample_legend_uvs(target, np.asarray(rebuilt['vertices'])[face])
+                residual = expected - np.asarray(rebuilt['uvs'], dtype=np.float64)[face]
+                steps = np.clip(np.rint(residual / UV_RESIDUAL_STEP), -32768, 32767).astype('<i2')
+                entry['uv_residual'] = base64.b64encode(steps.tobytes()).decode()
+                uv_error = rebuilt_uv_error(base, reconstruct(base, entry), target)
+            found = {**entry, 'error': float(error), 'uv_error': uv_error}
+            break
+        if found is None:
+            bases.append(name)
+        else:
+            models[name] = found
+    return {'version': VERSION, 'tolerance': tolerance, 'uv_tolerance': uv_tolerance, 'bases': sorted(bases),
+            'models': {name: models[name] for name in sorted(models)}}
+
+
+def find_model(model_dir, name):
+    for ext in ('.json', '.bin'):
+        path = os.path.join(model_dir, name + ext)
+        if os.path.exists(path):
+            return path
+    raise FileNotFoundError(f'no model {name} in {model_dir}')
+
+
+def load_models(model_dir):
+    paths = sorted(glob.glob(os.path.join(model_dir, '*.json')) + glob.glob(os.path.join(model_dir, '*.bin')))
+    # lods aren't keycap shapes of their own
+    return {model_name(p): read_mesh(p) for p in paths if '.lod' not in os.path.basename(p)}
+
+
+def load_table(model_dir):
+    with open(os.path.join(model_dir, TABLE_NAME)) as f:
+        table = json.loads(f.read())
+    if table.get('version') != VERSION:
+        raise ValueError(f'unsupported widths table version {table.get("version")}')
+    return table
+
+
+def build(model_dir, name, table=None, cache=None):
+    # the mesh for any model of the profile, stored or stretched
+    table = table or load_table(model_dir)
+    cache = {} if cache is None else cache
+    entry = table['models'].get(name)
+    base_name = name if entry is None else entry['base']
+    if base_name not in cache:
+        cache[base_name] = read_mesh(find_model(model_dir, base_name))
+    return cache[base_name] if entry is None else reconstruct(cache[base_name], entry)
+
+
+def write_table(table, model_dir):
+    path = os.path.join(model_dir, TABLE_NAME)
+    with open(path + '.tmp', 'w') as f:
+        f.write(json.dumps(table, indent=4))
+    os.replace(path + '.tmp', path)
+
+
+def validate(model_dir, table, tolerance, uv_tolerance=UV_TOLERANCE):
+    # rebuilds every table entry and compares it, and its uv map, with the model file still on disk
+    failures = []
+    cache = {}
+    for name, entry in table['models'].items():
+        model = read_mesh(find_model(model_dir, name))
+        rebuilt = build(model_dir, name, table, cache)
+        error = mesh_distance(rebuilt, model)
+        uv_error = rebuilt_uv_error(cache[entry['base']], rebuilt, model)
+        ok = error <= tolerance and uv_error <= uv_tolerance
+        print(f'{name}: from {entry["base"]}, distance {error:.4f}, uv {uv_error:.4f}'
+              f'{"" if ok else "  FAILED"}')
+        if not ok:
+            failures.append(name)
+    return failures
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='describe wider keycaps as stretched copies of narrower ones')
+    parser.add_argument('--models', default=MODEL_DIR, help='one profile directory')
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help='largest surface distance, model units')
+    parser.add_argument('--uv-tolerance', type=float, default=UV_TOLERANCE)
+    parser.add_argument('--validate', action='store_true',
+                        help='check the existing table against the model files instead of rebuilding it')
+    parser.add_argument('--write', metavar='DIR', help='write every model of the table, rebuilt, to DIR')
+    args = parser.parse_args()
+
+    if args.validate:
+        failures = validate(args.models, load_table(args.models), args.tolerance, args.uv_tolerance)
+        if failures:
+            raise SystemExit(f'{len(failures)} models off by more than {args.tolerance} (uv {args.uv_tolerance}): '
+                             f'{", ".join(failures)}')
+    else:
+        meshes = load_models(args.models)
+        table = detect(meshes, args.tolerance, args.uv_tolerance)
+        write_table(table, args.models)
+        for name, entry in table['models'].items():
+            print(f'{name}: {entry["base"]} stretched along {"xz"[entry["axis"] // 2]} by '
+                  f'{entry["extend"][0]:.3f}/{entry["extend"][1]:.3f}, distance {entry["error"]:.4f}, '
+                  f'uv {entry["uv_error"]:.4f}')
+        stored = sum(os.path.getsize(find_model(args.models, name)) for name in table['bases'])
+        total = sum(os.path.getsize(find_model(args.models, name)) for name in meshes)
+        table_size = os.path.getsize(os.path.join(args.models, TABLE_NAME))
+        print(f'{len(table["bases"])} base meshes for {len(meshes)} models: '
+              f'{total} -> {stored + table_size} bytes')
+
+    if args.write:
+        os.makedirs(args.write, exist_ok=True)
+        table = load_table(args.models)
+        cache = {}
+        for name in table['bases'] + list(table['models']):
+            write_mesh(os.path.join(args.write, name), build(args.models, name, table, cache), 'json')
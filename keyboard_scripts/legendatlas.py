@@ -0,0 +1,204 @@
+import argparse
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+# packs the per-key legend pngs (client/assets/legends/<key>.png) into a few power-of-two atlases
+# so a whole keyboard's legends come from one texture instead of one fetch and bind per key.
+# every legend is trimmed to the bounding box of its non-transparent pixels and packed with
+# transparent padding around it (keeps bilinear filtering and the first mip levels from bleeding
+# into a neighbour). writes <out>/atlas_<i>.png and <out>/legends.json:
+#   {"version": 1,
+#    "atlases": [{"file": "atlas_0.png", "size": [w, h]}, ...],
+#    "legends": {<key>: {"atlas": i, "rect": [u0, v0, u1, v1], "transform": [ou, ov, su, sv]}}}
+# all coordinates are texture coordinates (0..1, v = 0 at the top row, same as texImage2D from an
+# image). transform maps a texture coordinate of the original legend onto the atlas
+# (atlas = offset + scale * legend), rect is where the legend's content sits in the atlas; anything
+# the transform puts outside of rect was transparent in the original, but holds a neighbouring
+# legend in the atlas. the textured fragment shader only samples inside uTextureRect, so a keycap
+# drawn from an atlas has to pass its entry's rect there (KeyRenderInstruction.legendRect)
+VERSION = 1
+LEGEND_DIR = '../client/assets/legends'
+ATLAS_DIR = '../client/assets/legend_atlas'
+TABLE_NAME = 'legends.json'
+
+
+def trim(image):
+    # (content image, (x, y) of the content in the original); legends with nothing on them
+    # become a single transparent pixel
+    bbox = image.getchannel('A').getbbox()
+    if bbox is None:
+        return Image.new('RGBA', (1, 1)), (0, 0)
+    return image.crop(bbox), bbox[:2]
+
+
+def _next_pow2(n):
+    return 1 << max(0, (n - 1).bit_length())
+
+
+def shelf_pack(sizes, width, height):
+    # next-fit shelves, tallest first. sizes are padded sizes; returns {index: (x, y)} for what fit
+    order = sorted(range(len(sizes)), key=lambda i: (-sizes[i][1], -sizes[i][0]))
+    placed = {}
+    x = y = shelf_height = 0
+    for i in order:
+        w, h = sizes[i]
+        if w > width:
+            continue
+        if x + w > width:
+            x, y = 0, y + shelf_height
+            shelf_height = 0
+        if y + h > height:
+            continue
+        placed[i] = (x, y)
+        x += w
+        shelf_height = max(shelf_height, h)
+    return placed
+
+
+def pack(sizes, max_size):
+    # smallest power-of-two atlas (growing width first) that holds everything left; if even
+    # max_size x max_size is not enough it is filled and the rest goes to the next atlas.
+    # returns [(atlas size, {index: (x, y)})...]
+    for w, h in sizes:
+        if w > max_size or h > max_size:
+            raise ValueError(f'a {w}x{h} legend does not fit in a {max_size}x{max_size} atlas')
+    remaining = list(range(len(sizes)))
+    atlases = []
+    while remaining:
+        sub = [sizes[i] for i in remaining]
+        area = sum(w * h for w, h in sub)
+        width = min(max_size, _next_pow2(max(max(w for w, _ in sub), int(area ** 0.5))))
+        height = min(max_size, _next_pow2(max(h for _, h in sub)))
+        while True:
+            placed = shelf_pack(sub, width, height)
+            if len(placed) == len(sub) or (width == max_size and height == max_size):
+                break
+            if width <= height and width < max_size:
+                width *= 2
+            else:
+                height *= 2
+        atlases.append(((width, height), {remaining[j]: pos for j, pos in placed.items()}))
+        remaining = [remaining[j] for j in range(len(sub)) if j not in placed]
+    return atlases
+
+
+def build_atlases(legends, padding=4, max_size=2048, scale=1.0):
+    # legends: {name: RGBA image}. returns (atlas images, table)
+    names = sorted(legends)
+    content = []
+    for name in names:
+        image = legends[name]
+        if scale != 1.0:
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.LANCZOS)
+        content.append((image.size, *trim(image)))
+    sizes = [(c.width + 2 * padding, c.height + 2 * padding) for _, c, _ in content]
+
+    atlases = []
+    table = {'version': VERSION, 'atlases': [], 'legends': {}}
+    for atlas_index, ((width, height), placed) in enumerate(pack(sizes, max_size)):
+        atlas = Image.new('RGBA', (width, height))
+        for i, (x, y) in placed.items():
+            (full_w, full_h), image, (cx, cy) = content[i]
+            x += padding
+            y += padding
+            atlas.paste(image, (x, y))
+            # the original legend's top left corner lands at (x - cx, y - cy)
+            table['legends'][names[i]] = {
+                'atlas': atlas_index,
+                'rect': [x / width, y / height, (x + image.width) / width, (y + image.height) / height],
+                'transform': [(x - cx) / width, (y - cy) / height, full_w / width, full_h / height]
+            }
+        atlases.append(atlas)
+        table['atlases'].append({'file': f'atlas_{atlas_index}.png', 'size': [width, height]})
+    table['legends'] = {name: table['legends'][name] for name in names}
+    return atlases, table
+
+
+def to_atlas(uvs, entry):
+    # texture coordinates of the original legend -> atlas texture coordinates
+    ou, ov, su, sv = entry['transform']
+    uvs = np.asarray(uvs, dtype=np.float64)
+    return np.stack([ou + su * uvs[:, 0], ov + sv * uvs[:, 1]], axis=1)
+
+
+def remap_uvs(uvs, entry):
+    # keycap model uvs (as written by the converters) -> model uvs that sample this legend in its
+    # atlas. the textured shader samples (1 - u, v), so the flip is undone around the transform;
+    # uvs below 0 mean "no legend here" and are left alone
+    uvs = np.asarray(uvs, dtype=np.float64)
+    flipped = np.stack([1 - uvs[:, 0], uvs[:, 1]], axis=1)
+    mapped = to_atlas(flipped, entry)
+    out = np.stack([1 - mapped[:, 0], mapped[:, 1]], axis=1)
+    no_legend = (uvs < 0).any(axis=1)
+    out[no_legend] = uvs[no_legend]
+    return out
+
+
+def load_legends(legend_dir=LEGEND_DIR):
+    legends = {}
+    for file_name in sorted(os.listdir(legend_dir)):
+        name, ext = os.path.splitext(file_name)
+        if ext.lower() == '.png':
+            legends[name] = Image.open(os.path.join(legend_dir, file_name)).convert('RGBA')
+    return legends
+
+
+def check(legends, atlases, table, scale=1.0):
+    # every legend has to read back from its atlas exactly as it was (after scaling)
+    for name, image in legends.items():
+        if scale != 1.0:
+            image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                                 Image.LANCZOS)
+        entry = table['legends'][name]
+        atlas = atlases[entry['atlas']]
+        u0, v0, u1, v1 = entry['rect']
+        box = (round(u0 * atlas.width), round(v0 * atlas.height), round(u1 * atlas.width), round(v1 * atlas.height))
+        expected, _ = trim(image)
+        if np.any(np.asarray(atlas.crop(box)) != np.asarray(expected)):
+            raise ValueError(f'{name} does not match its atlas region')
+        # the content's corner has to come out of the transform where rect says it is
+        bbox = image.getchannel('A').getbbox() or (0, 0, 1, 1)
+        corner = to_atlas([[bbox[0] / image.width, bbox[1] / image.height]], entry)[0]
+        if not np.allclose(corner, (u0, v0)):
+            raise ValueError(f'{name} transform and rect disagree')
+
+
+def write_atlases(atlases, table, out_dir):
+    os.makedirs(out_dir, exist_ok=True)
+    for atlas, info in zip(atlases, table['atlases']):
+        tmp_path = os.path.join(out_dir, info['file'] + '.tmp')
+        atlas.save(tmp_path, format='PNG', optimize=True)
+        os.replace(tmp_path, os.path.join(out_dir, info['file']))
+    table_path = os.path.join(out_dir, TABLE_NAME)
+    with open(table_path + '.tmp', 'w') as f:
+        f.write(json.dumps(table, indent=4))
+    os.replace(table_path + '.tmp', table_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pack the legend pngs into power-of-two texture atlases')
+    parser.add_argument('--legends', default=LEGEND_DIR)
+    parser.add_argument('--out', default=ATLAS_DIR)
+    parser.add_argument('--padding', type=int, default=4, help='transparent pixels around every legend')
+    parser.add_argument('--max-size', type=int, default=2048, help='largest atlas side, a power of two')
+    parser.add_argument('--scale', type=float, default=1.0, help='resize legends before packing')
+    args = parser.parse_args()
+
+    if args.max_size & (args.max_size - 1):
+        parser.error('--max-size has to be a power of two')
+
+    legends = load_legends(args.legends)
+    atlases, table = build_atlases(legends, args.padding, args.max_size, args.scale)
+    check(legends, atlases, table, args.scale)
+    write_atlases(atlases, table, args.out)
+
+    source_bytes = sum(os.path.getsize(os.path.join(args.legends, f)) for f in os.listdir(args.legends))
+    atlas_bytes = sum(os.path.getsize(os.path.join(args.out, a['file'])) for a in table['atlases'])
+    for atlas, info in zip(atlases, table['atlases']):
+        filled = np.count_nonzero(np.asarray(atlas.getchannel('A'))) / (atlas.width * atlas.height)
+        print(f'{info["file"]}: {atlas.width}x{atlas.height}, {filled:.0%} of pixels drawn on')
+    print(f'{len(legends)} legends in {len(atlases)} atlas(es), {source_bytes} -> {atlas_bytes} bytes')
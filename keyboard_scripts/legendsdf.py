@@ -0,0 +1,200 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+from scipy import ndimage
+
+# low resolution signed distance fields for the key legends. a legend's shape is taken from its
+# png in client/assets/legends (the "standard" font) or drawn from a font's glyphs, the exact
+# euclidean distance to its outline is computed at full resolution on both sides of it and the
+# result is box-filtered down to --size texels. written as 8 bit grayscale pngs to
+# <out>/<font>/<key>.png, so the keycapsInfo "font" field can pick the directory:
+#   texel = 0.5 + distance / (2 * spread)       distance in output texels, positive inside the legend
+# the outline is where texel == 0.5; a shader gets a sharp edge at any zoom with
+#   alpha = smoothstep(0.5 - w, 0.5 + w, texture2D(uTexture, uv).r)   (w ~ fwidth of the value)
+# instead of the png's alpha
+LEGEND_DIR = '../client/assets/legends'
+SDF_DIR = '../client/assets/legends_sdf'
+STANDARD_FONT = 'standard'
+# the legends only fill a small part of their 512 pixel pngs, so thin strokes need this many texels
+# to survive; at 64 the shift arrows and enter lose a fifth to half of their ink
+DEFAULT_SIZE = 128
+# share of a legend's ink the round trip may get wrong before the build fails
+MAX_ERROR = 0.08
+# font strokes thinner than this many texels are thickened to it; hairline fonts don't survive
+# the box filter otherwise
+MIN_STROKE = 2.5
+
+# what is printed on a key when it's drawn from a font; lines are top to bottom.
+# single letters and digits not listed here print as themselves
+SHIFTED = {
+    '1': '!', '2': '@', '3': '#', '4': '$', '5': '%', '6': '^', '7': '&', '8': '*', '9': '(', '0': ')'
+}
+LABELS = {
+    'Tilde': '~\n`', 'Minus': '_\n-', 'Equals': '+\n=', 'OSqr': '{\n[', 'CSqr': '}\n]', 'Backslash': '|\n\\',
+    'Semicolon': ':\n;', 'Apostrophe': '"\n\'', 'Comma': '<\n,', 'Period': '>\n.', 'Forwardslash': '?\n/',
+    'Backspace': '←', 'Tab': '⇤\n⇥', 'Caps': '⇩', 'Enter': '↵', 'ANSIEnter': '↵',
+    'LShift': '⇧', 'RShift1_75': '⇧', 'RShift2_75': '⇧', 'Space6_25': '',
+    'LCtrl': 'Ctrl', 'RCtrl': 'Ctrl', 'LWin': 'Win', 'RWin': 'Win', 'LAlt': 'Alt', 'RAlt': 'Alt', 'Fn': 'Fn',
+    'Esc': 'Esc', 'Delete': 'Delete', 'Insert': 'Insert', 'Home': 'Home', 'End': 'End', 'PgUp': 'PgUp',
+    'PgDn': 'PgDn', 'PrtScr': 'Print', 'ScrlLck': 'Scroll', 'Pause': 'Pause',
+    'UArrow': '↑', 'DArrow': '↓', 'LArrow': '←', 'RArrow': '→',
+    'NumLck': 'Num', 'NumDivide': '÷', 'NumMultiply': '×', 'NumMinus': '−', 'NumPlus': '+',
+    'NumPoint': '.', 'NumEnter': '↲'
+}
+
+
+def label(key):
+    # 'LCtrl1_25' -> 'Ctrl', '1' -> '!\n1', 'Num7' -> '7', 'F5' -> 'F5'
+    if key in LABELS:
+        return LABELS[key]
+    # modifiers come in several widths: LCtrl1, LCtrl1_25, LCtrl1_5
+    base = key.rstrip('0123456789_')
+    if base in LABELS:
+        return LABELS[base]
+    if key in SHIFTED:
+        return f'{SHIFTED[key]}\n{key}'
+    if key.startswith('Num') and key[3:].isdigit():
+        return key[3:]
+    return key
+
+
+def signed_distance(mask):
+    # distance in pixels from every pixel center to the outline, positive inside. the outline runs
+    # between pixels, hence the half pixel
+    if not mask.any():
+        return np.full(mask.shape, -np.inf)
+    if mask.all():
+        return np.full(mask.shape, np.inf)
+    inside = ndimage.distance_transform_edt(mask)
+    outside = ndimage.distance_transform_edt(~mask)
+    return np.where(mask, inside - 0.5, 0.5 - outside)
+
+
+def to_sdf(mask, size, spread=4.0):
+    # full resolution mask -> size x size uint8 field, spread is in output texels
+    distance = signed_distance(mask)
+    scale = size / mask.shape[1]
+    clipped = np.clip(distance * scale, -spread, spread).astype(np.float32)
+    small = np.asarray(Image.fromarray(clipped, 'F').resize((size, size), Image.BOX))
+    return np.clip(np.rint((0.5 + small / (2 * spread)) * 255), 0, 255).astype(np.uint8)
+
+
+def from_sdf(field, size):
+    # what a shader draws from the field at size x size pixels, as a boolean mask
+    big = Image.fromarray(field.astype(np.float32), 'F').resize((size, size), Image.BILINEAR)
+    return np.asarray(big) >= 127.5
+
+
+def legend_mask(image):
+    return np.asarray(image.convert('RGBA').getchannel('A')) >= 128
+
+
+def embolden(mask, min_width):
+    # grows the shape until its thin strokes are about min_width pixels wide. stroke half widths
+    # are read off the ridge of the inside distance; the thinnest tenth decides
+    if not mask.any():
+        return mask
+    inside = ndimage.distance_transform_edt(mask)
+    ridge = mask & (inside == ndimage.maximum_filter(inside, 3))
+    grow = min_width / 2 - np.percentile(inside[ridge], 10)
+    if grow <= 0:
+        return mask
+    return ndimage.distance_transform_edt(~mask) <= grow
+
+
+def font_mask(text, font_path, reference, min_width=0):
+    # the label drawn in another font, fitted into the same box the standard legend's ink occupies
+    # so it lands on the same part of the keycap, with strokes at least min_width pixels wide
+    height, width = reference.shape
+    if not text or not reference.any():
+        return np.zeros(reference.shape, dtype=bool)
+    rows = np.flatnonzero(reference.any(axis=1))
+    cols = np.flatnonzero(reference.any(axis=0))
+    box_w, box_h = cols[-1] - cols[0] + 1, rows[-1] - rows[0] + 1
+
+    font = ImageFont.truetype(font_path, 256)
+    canvas = Image.new('L', (1, 1))
+    left, top, right, bottom = ImageDraw.Draw(canvas).multiline_textbbox((0, 0), text, font=font, align='left')
+    glyphs = Image.new('L', (right - left, bottom - top))
+    ImageDraw.Draw(glyphs).multiline_text((-left, -top), text, font=font, fill=255, align='left')
+    bbox = glyphs.getbbox()
+    if bbox is None:
+        return np.zeros(reference.shape, dtype=bool)
+    glyphs = glyphs.crop(bbox)
+
+    scale = min(box_w / glyphs.width, box_h / glyphs.height)
+    fitted = glyphs.resize((max(1, round(glyphs.width * scale)), max(1, round(glyphs.height * scale))), Image.LANCZOS)
+    out = Image.new('L', (width, height))
+    # centered on the reference box
+    out.paste(fitted, (int(cols[0] + (box_w - fitted.width) // 2), int(rows[0] + (box_h - fitted.height) // 2)))
+    return embolden(np.asarray(out) >= 128, min_width)
+
+
+def write_field(field, out_path):
+    tmp_path = out_path + '.tmp'
+    Image.fromarray(field, 'L').save(tmp_path, format='PNG', optimize=True)
+    os.replace(tmp_path, out_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='turn the legend pngs or font glyphs into small signed distance fields')
+    parser.add_argument('--legends', default=LEGEND_DIR)
+    parser.add_argument('--out', default=SDF_DIR)
+    parser.add_argument('--size', type=int, default=DEFAULT_SIZE, help='side of every field in texels')
+    parser.add_argument('--spread', type=float, default=4.0, help='distance covered by the value range, in texels')
+    parser.add_argument('--font', action='append', default=[], metavar='NAME=PATH',
+                        help='also build <out>/NAME from a truetype font, e.g. mono=DejaVuSansMono-Bold.ttf')
+    parser.add_argument('--max-error', type=float, default=MAX_ERROR,
+                        help='fail, before writing anything, if any legend gets more than this share of its ink wrong')
+    parser.add_argument('--min-stroke', type=float, default=MIN_STROKE,
+                        help='thicken font strokes to at least this many texels')
+    args = parser.parse_args()
+
+    fonts = {STANDARD_FONT: None}
+    for spec in args.font:
+        name, sep, path = spec.partition('=')
+        if not sep or name == STANDARD_FONT:
+            parser.error(f'--font expects NAME=PATH with a name other than {STANDARD_FONT!r}, got {spec!r}')
+        fonts[name] = path
+
+    keys = sorted(os.path.splitext(f)[0] for f in os.listdir(args.legends) if f.lower().endswith('.png'))
+    references = {}
+    fields = {}
+    failed = []
+    for font_name, font_path in fonts.items():
+        mismatch = {}
+        for key in keys:
+            if key not in references:
+                references[key] = legend_mask(Image.open(os.path.join(args.legends, key + '.png')))
+            reference = references[key]
+            min_width = args.min_stroke * reference.shape[1] / args.size
+            mask = reference if font_path is None else font_mask(label(key), font_path, reference, min_width)
+
+            field = fields[font_name, key] = to_sdf(mask, args.size, args.spread)
+            # how much of the shape survives the round trip at the original resolution
+            if mask.any():
+                drawn = from_sdf(field, mask.shape[1])
+                mismatch[key] = np.count_nonzero(drawn != mask) / np.count_nonzero(mask)
+
+        worst = max(mismatch, key=mismatch.get)
+        print(f'{font_name}: {len(keys)} legends ({args.size}x{args.size}), outline error '
+              f'{np.mean(list(mismatch.values())):.1%} of ink on average, {mismatch[worst]:.1%} at worst ({worst})')
+        failed += [f'{font_name}/{key} {error:.1%}' for key, error in mismatch.items() if error > args.max_error]
+
+    if failed:
+        print(f'{len(failed)} legends over the {args.max_error:.1%} outline error limit, nothing written. '
+              f'try a larger --size or --min-stroke: ' + ', '.join(failed))
+        sys.exit(1)
+
+    for font_name in fonts:
+        os.makedirs(os.path.join(args.out, font_name), exist_ok=True)
+        source_bytes = out_bytes = 0
+        for key in keys:
+            out_path = os.path.join(args.out, font_name, key + '.png')
+            write_field(fields[font_name, key], out_path)
+            out_bytes += os.path.getsize(out_path)
+            source_bytes += os.path.getsize(os.path.join(args.legends, key + '.png'))
+        print(f'{font_name}: {source_bytes} -> {out_bytes} bytes written to {os.path.join(args.out, font_name)}')
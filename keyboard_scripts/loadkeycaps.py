@@ -1,106 +1,29 @@
-import json
-import string
-from functools import reduce
+import argparse
+import os
 
-all_verts = []
-all_normals = []
-all_uvs = []
-all_tris = []
-vert_index_offset = 0
-uv_index_offset = 0
-normal_index_offset = 0
-with open('resources/capstogethercopy.obj') as f:
-    row = None
-    for line in f:
-        if line[0:2] == 'o ':
-            if row is not None:
-                verts = all_verts
-                norms = [None for _ in all_verts]
-                uvs = [None for _ in all_verts]
-                #untextured_tris = []
-                #textured_tris = []
-                tris = []
+from batch_convert import convert_all
+from meshformat import FORMATS
 
-                # c = reduce(lambda l, e: l + [x[0] for x in e], all_tris, [])
-                # m = max(c)
-                # mi = min(c)
-                for tri in all_tris:
-                    for v in tri:
-                        pi, ti, ni = v
-                        pisub = pi - vert_index_offset
-                        tisub = ti - uv_index_offset
-                        nisub = ni - normal_index_offset
-                        if pisub < 0 or tisub < 0 or nisub < 0:
-                            print("oop")
-                            exit()
-                        uvs[pisub] = all_uvs[tisub]
-                        norms[pisub] = all_normals[nisub]
+# the cherry profile through the same pipeline (build manifest, vertex cache order) as
+# batch_convert.py, for the source file this script has always read
+SOURCE = 'resources/capstogethercopy.obj'
+PROFILE = 'cherry'
+OUT_ROOT = 'resources/models/keycaps'
 
-                    # add_to = untextured_tris if all(all_uvs[v[1] - uv_index_offset] == [0, 0] for v in tri) else textured_tris
-                    tris.append([v[0] - vert_index_offset for v in tri])
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=f'convert {SOURCE} into the {PROFILE} keycap models')
+    parser.add_argument('--format', choices=FORMATS, default='json')
+    parser.add_argument('--debug-obj', action='store_true', help='also write a _test.obj next to every rebuilt model')
+    parser.add_argument('--force', action='store_true', help='rebuild everything regardless of the build manifest')
+    args = parser.parse_args()
 
-                x = json.dumps({
-                    'vertices': verts,
-                    'normals': norms,
-                    'triangles': tris,
-                    #'texturedTriangles': textured_tris,
-                    'uvs': uvs
-                })
+    converted, skipped, failed = convert_all([SOURCE], PROFILE, OUT_ROOT, args.format, os.cpu_count(),
+                                             debug_obj=args.debug_obj, force=args.force)
+    print(f'{len(converted)} models converted, {skipped} unchanged, {len(failed)} skipped or failed')
+    if failed:
+        raise SystemExit(1)
 
-                if row in string.digits:
-                    with open(f'resources/models/keycaps/cherry/R{row}_{units}U.json', 'w') as f:
-                        f.write(x)
-                else:
-                    with open(f'resources/models/keycaps/cherry/{row}.json', 'w') as f:
-                        f.write(x)
 
-                with open(f'resources/models/keycaps/cherry/{row}_{units}U_test.obj', 'w') as f:
-                    for v in verts:
-                        f.write('v ' + ' '.join(map(str, v)) + '\n')
-                    for n in norms:
-                        f.write('vn ' + ' '.join(map(str, n)) + '\n')
-                    for uv in uvs:
-                        f.write('vt ' + ' '.join(map(str, uv)) + '\n')
-                    for t in tris:
-                        f.write('f ' + ' '.join(map(lambda x: str(x + 1), t)) + '\n')
-                    # for t in textured_tris:
-                    #     f.write('f ' + ' '.join(map(lambda x: str(x + 1), t)) + '\n')
-
-                vert_index_offset += len(all_verts)
-                uv_index_offset += len(all_uvs)
-                normal_index_offset += len(all_normals)
-                all_verts = []
-                all_uvs = []
-                all_normals = []
-                all_tris = []
-            
-            if line[2] == 'R':
-                row = line[3]
-                units = line[5:line.index('U')]
-            else:
-                row = line[2:line.index('_Plane')]
-
-            
-
-        else:
-            line = line.strip()
-            
-            words = line.split(' ')
-            if len(words) == 0:
-                break
-
-            data = words[1:]
-            if words[0] == 'v':
-                all_verts.append([float(x) for x in data])
-            elif words[0] == 'vn':
-                all_normals.append([float(x) for x in data])
-            elif words[0] == 'vt':
-                all_uvs.append([float(x) for x in data])
-            elif words[0] == 'f':
-                split = [[int(x) - 1 for x in d.split('/')] for d in data]
-                all_tris.append(split)
-
-            
 
 # with open('resources/capstogether.obj') as f:
 #     for line in f:
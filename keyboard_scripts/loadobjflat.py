@@ -1,62 +1,19 @@
-import json
+from meshformat import format_arg, write_mesh, write_obj
+from meshindex import index_mesh, report
+from objparse import read_obj
+from vertexcache import optimize
 
-all_verts = []
-all_normals = []
-all_uvs = []
-all_tris = []
-with open('resources/stabs.obj') as f:
-    for line in f:
-        line = line.strip()
-        words = line.split(' ')
-        if len(words) == 0:
-            break
+fmt = format_arg()
 
-        data = words[1:]
-        if words[0] == 'v':
-            all_verts.append([float(x) for x in data])
-        elif words[0] == 'vn':
-            all_normals.append([float(x) for x in data])
-        elif words[0] == 'vt':
-            all_uvs.append([float(x) for x in data])
-        elif words[0] == 'f':
-            split = [[int(x) - 1 for x in d.split('//')] for d in data]
-            all_tris.append(split)
+obj = read_obj('resources/stabs.obj')
 
-# verts = all_verts
-# norms = [None for _ in all_verts]
-# uvs = [None for _ in all_verts]
-verts = []
-norms = []
-uvs = []
-tris = []
-for i, tri in enumerate(all_tris):
-    ni = tri[0][1]
-    for v in tri:
-        #pi, ti, _ = v
-        pi = v[0]
-        verts.append(all_verts[pi])
-        #uvs.append(all_uvs[ti])
-        norms.append(all_normals[ni])
+# flat shaded: every corner takes the normal of the triangle's first corner
+flat_tris = obj.tris.copy()
+flat_tris[:, :, 1] = -1
+flat_tris[:, :, 2] = flat_tris[:, 0:1, 2]
+mesh, stats = index_mesh(obj.positions, obj.normals, None, flat_tris)
+report('stabilizer', stats)
+# reordered for the vertex cache like the keycaps in batch_convert.py
+write_mesh('resources/models/stabilizer', optimize(mesh), fmt)
 
-    tris.append([i * 3 + x for x in range(3)])
-
-x = json.dumps({
-    'vertices': verts,
-    'normals': norms,
-    'triangles': tris,
-    #'uvs': uvs
-})
-with open('resources/models/stabilizer.json', 'w') as f:
-    f.write(x)
-
-
-
-with open('resources/teststab.obj', 'w') as f:
-    for v in verts:
-        f.write('v ' + ' '.join(map(str, v)) + '\n')
-    for n in norms:
-        f.write('vn ' + ' '.join(map(str, n)) + '\n')
-    # for uv in uvs:
-    #     f.write('vt ' + ' '.join(map(str, uv)) + '\n')
-    for t in tris:
-        f.write('f ' + ' '.join(map(lambda x: str(x + 1), t)) + '\n')
\ No newline at end of file
+write_obj('resources/teststab.obj', mesh)
@@ -0,0 +1,177 @@
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+
+from keycapmodels import keycap_model
+from meshformat import decode_bin
+from quantize import COMPRESSION_SUFFIXES, decode_quantized, decompress
+
+# one file holding every model of a keycap profile (all little-endian):
+#   header: magic 'KBDB', u16 version, u16 entry count, u32 data offset
+#   entry table, per model: u16 name length, utf-8 name, u8 format, u32 offset, u32 length
+#   model data; every model starts on a 4 byte boundary so typed array views can point straight into it
+# offsets are from the start of the file. models are stored in the order the keyboard layouts first
+# use them, so the models of one layout sit next to each other and fetching them is a single short
+# ranged read; models no layout uses come last. compressed .qbin.zst/.qbin.br inputs are stored
+# decompressed, so every model can be viewed in place
+MAGIC = b'KBDB'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI')
+ENTRY = struct.Struct('<BII')
+NAME_LEN = struct.Struct('<H')
+
+BUNDLE_FORMATS = ('json', 'bin', 'qbin')
+EXTENSIONS = {'.json': 'json', '.bin': 'bin', '.qbin': 'qbin'}
+COMPRESSIONS = {suffix: method for method, suffix in COMPRESSION_SUFFIXES.items() if suffix}
+KEYBOARD_INFO = '../server/assets/keyboardInfo.json'
+
+
+def _align(n):
+    return n + (-n % 4)
+
+
+def collect_models(model_dir, preference=('bin', 'qbin', 'json')):
+    # one file per model name, picking the first available format in preference order
+    found = {}
+    for path in sorted(glob.glob(os.path.join(model_dir, '*'))):
+        name, ext = os.path.splitext(os.path.basename(path))
+        if ext in COMPRESSIONS:
+            # R1_1U.qbin.zst counts as a qbin, unless there is an uncompressed R1_1U.qbin too
+            name, ext = os.path.splitext(name)
+            if ext != '.qbin' or found.get(name, ('', ''))[1] == 'qbin':
+                continue
+        fmt = EXTENSIONS.get(ext)
+        if fmt is None or fmt not in preference:
+            continue
+        if name not in found or preference.index(fmt) < preference.index(found[name][1]):
+            found[name] = (path, fmt)
+    return found
+
+
+def layout_order(keyboard_info_path=KEYBOARD_INFO):
+    # every keycap model name in the order the keyboards in keyboardInfo.json first use them
+    with open(keyboard_info_path) as f:
+        keyboards = json.loads(f.read())
+    order = {}
+    for keyboard in keyboards.values():
+        for group in keyboard['keyGroups']:
+            for key in group['keys']:
+                order.setdefault(keycap_model(key, group['row']), len(order))
+    return list(order)
+
+
+def write_bundle(out_path, models, order=()):
+    # models maps name -> (path, format); names in order come first, in that order, the rest sorted
+    rank = {name: i for i, name in enumerate(order)}
+    names = sorted(models, key=lambda name: (rank.get(name, len(rank)), name))
+    table_size = sum(NAME_LEN.size + len(name.encode()) + ENTRY.size for name in names)
+    data_offset = _align(HEADER.size + table_size)
+
+    blobs = []
+    entries = []
+    offset = data_offset
+    for name in names:
+        path, fmt = models[name]
+        with open(path, 'rb') as f:
+            blob = f.read()
+        ext = os.path.splitext(path)[1]
+        if ext in COMPRESSIONS:
+            blob = decompress(blob, COMPRESSIONS[ext])
+        entries.append((name, fmt, offset, len(blob)))
+        blobs.append(blob + b'\0' * (-len(blob) % 4))
+        offset += _align(len(blob))
+
+    with open(out_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(names), data_offset))
+        for name, fmt, entry_offset, length in entries:
+            encoded = name.encode()
+            f.write(NAME_LEN.pack(len(encoded)) + encoded + ENTRY.pack(BUNDLE_FORMATS.index(fmt), entry_offset, length))
+        f.write(b'\0' * (data_offset - HEADER.size - table_size))
+        for blob in blobs:
+            f.write(blob)
+    return entries
+
+
+class MeshBundle:
+    # memory-maps a bundle; raw() and mesh() hand out views into the mapping without copying
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._map)
+
+        magic, version, count, self.data_offset = HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC:
+            raise ValueError('not a mesh bundle')
+        if version != VERSION:
+            raise ValueError(f'unsupported mesh bundle version {version}')
+
+        self.entries = {}
+        pos = HEADER.size
+        for _ in range(count):
+            (name_len,) = NAME_LEN.unpack_from(self._map, pos)
+            pos += NAME_LEN.size
+            name = bytes(self._map[pos:pos + name_len]).decode()
+            pos += name_len
+            fmt, offset, length = ENTRY.unpack_from(self._map, pos)
+            pos += ENTRY.size
+            self.entries[name] = (BUNDLE_FORMATS[fmt], offset, length)
+
+    def names(self):
+        return list(self.entries)
+
+    def raw(self, name):
+        fmt, offset, length = self.entries[name]
+        return fmt, self._view[offset:offset + length]
+
+    def mesh(self, name):
+        fmt, buf = self.raw(name)
+        if fmt == 'bin':
+            return decode_bin(buf)
+        if fmt == 'qbin':
+            return decode_quantized(buf)
+        return json.loads(bytes(buf))
+
+    def span(self, names):
+        # smallest (offset, length) byte range covering the given models, for one ranged read
+        ranges = [self.entries[name][1:] for name in names]
+        start = min(offset for offset, _ in ranges)
+        end = max(offset + length for offset, length in ranges)
+        return start, end - start
+
+    def close(self):
+        # meshes handed out by mesh() and raw() may outlive the bundle: while any of them still
+        # points into the mapping it can't be unmapped, so it is left to go away with the last one
+        if self._map is None:
+            return
+        self._view.release()
+        try:
+            self._map.close()
+        except BufferError:
+            pass
+        self._map = self._view = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='pack every model of a keycap profile into one bundle')
+    parser.add_argument('profile_dirs', nargs='+', help='e.g. ../server/assets/models/keycaps/cherry')
+    parser.add_argument('--prefer', default='bin,qbin,json', help='format preference when a model exists in several')
+    parser.add_argument('--layouts', default=KEYBOARD_INFO, help='keyboardInfo.json whose layouts decide the model order')
+    args = parser.parse_args()
+
+    preference = tuple(args.prefer.split(','))
+    order = layout_order(args.layouts)
+    for profile_dir in args.profile_dirs:
+        profile_dir = profile_dir.rstrip('/\\')
+        out_path = f'{profile_dir}.bundle'
+        entries = write_bundle(out_path, collect_models(profile_dir, preference), order)
+        print(f'{out_path}: {len(entries)} models, {os.path.getsize(out_path)} bytes')
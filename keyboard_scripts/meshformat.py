@@ -0,0 +1,133 @@
+import argparse
+import json
+import struct
+
+import numpy as np
+
+# binary mesh layout (all little-endian):
+#   header: magic 'KBDM', u16 version, u16 flags, u32 vertex count, u32 index count
+#   f32 positions[vertex count * 3]
+#   f32 normals[vertex count * 3]
+#   f32 uvs[vertex count * 2]            (only if FLAG_UVS)
+#   u16/u32 indices[index count]         (u32 only if FLAG_UINT32_INDICES)
+# every section starts on a 4 byte boundary so it can be handed to a typed array view as-is
+MAGIC = b'KBDM'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII')
+
+FLAG_UVS = 1
+FLAG_UINT32_INDICES = 2
+
+FORMATS = ('bin', 'json')
+
+
+def _pad(buf):
+    return buf + b'\0' * (-len(buf) % 4)
+
+
+def encode_bin(mesh):
+    verts = np.asarray(mesh['vertices'], dtype='<f4')
+    uvs = mesh.get('uvs')
+    indices = np.asarray(mesh['triangles']).ravel()
+
+    flags = 0
+    if uvs is not None:
+        flags |= FLAG_UVS
+    if len(verts) > 0xffff:
+        flags |= FLAG_UINT32_INDICES
+
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, len(verts), len(indices)),
+        verts.tobytes(),
+        np.asarray(mesh['normals'], dtype='<f4').tobytes()
+    ]
+    if uvs is not None:
+        parts.append(np.asarray(uvs, dtype='<f4').tobytes())
+    parts.append(_pad(indices.astype('<u4' if flags & FLAG_UINT32_INDICES else '<u2').tobytes()))
+
+    return b''.join(parts)
+
+
+def decode_bin(buf):
+    # returns read-only views into buf, no copying
+    magic, version, flags, num_verts, num_indices = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('not a binary mesh file')
+    if version != VERSION:
+        raise ValueError(f'unsupported binary mesh version {version}')
+
+    offset = HEADER.size
+
+    def take(dtype, count, width):
+        nonlocal offset
+        arr = np.frombuffer(buf, dtype=dtype, count=count * width, offset=offset)
+        offset += arr.nbytes
+        return arr.reshape(count, width)
+
+    mesh = {
+        'vertices': take('<f4', num_verts, 3),
+        'normals': take('<f4', num_verts, 3)
+    }
+    if flags & FLAG_UVS:
+        mesh['uvs'] = take('<f4', num_verts, 2)
+    mesh['triangles'] = take('<u4' if flags & FLAG_UINT32_INDICES else '<u2', num_indices // 3, 3)
+
+    return mesh
+
+
+def _json_list(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'f':
+        # obj exports carry 6 decimals; float32 reprs would otherwise bloat the output
+        return np.round(values.astype(np.float64), 6).tolist()
+    return values.tolist()
+
+
+def encode_json(mesh):
+    return json.dumps({k: _json_list(v) for k, v in mesh.items() if v is not None})
+
+
+def write_mesh(path, mesh, fmt='json'):
+    # path is given without an extension; the format decides it
+    if fmt == 'bin':
+        with open(path + '.bin', 'wb') as f:
+            f.write(encode_bin(mesh))
+    elif fmt == 'json':
+        with open(path + '.json', 'w') as f:
+            f.write(encode_json(mesh))
+    else:
+        raise ValueError(f'unknown mesh format {fmt}')
+
+
+def read_mesh(path):
+    if path.endswith('.bin'):
+        with open(path, 'rb') as f:
+            return decode_bin(f.read())
+
+    with open(path) as f:
+        mesh = json.loads(f.read())
+    return {
+        'vertices': np.array(mesh['vertices'], dtype=np.float32),
+        'normals': np.array(mesh['normals'], dtype=np.float32),
+        'uvs': np.array(mesh['uvs'], dtype=np.float32) if 'uvs' in mesh else None,
+        'triangles': np.array(mesh['triangles'], dtype=np.uint32)
+    }
+
+
+def write_obj(path, mesh):
+    # debug dump that can be opened in blender to eyeball a converted model
+    with open(path, 'w') as f:
+        np.savetxt(f, mesh['vertices'], fmt='v %.6g %.6g %.6g')
+        np.savetxt(f, mesh['normals'], fmt='vn %.6g %.6g %.6g')
+        if mesh.get('uvs') is not None:
+            np.savetxt(f, mesh['uvs'], fmt='vt %.6g %.6g')
+        np.savetxt(f, np.asarray(mesh['triangles']) + 1, fmt='f %d %d %d')
+
+
+def format_arg(argv=None):
+    # shared '--format json|bin' flag for the converter scripts. json stays the default while
+    # server/routes/models.ts only serves .json files
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--format', choices=FORMATS, default='json',
+                        help='json is what the server serves today, bin writes packed float32/uint16 buffers')
+    return parser.parse_args(argv).format
@@ -0,0 +1,91 @@
+import numpy as np
+
+from meshformat import HEADER
+
+
+def _face_normals(positions, tris):
+    # unit normal of every triangle repeated for its three corners; zero for degenerate ones
+    a, b, c = (positions[tris[:, k, 0]].astype(np.float64) for k in range(3))
+    n = np.cross(b - a, c - a)
+    length = np.linalg.norm(n, axis=1, keepdims=True)
+    n = np.divide(n, length, out=np.zeros_like(n), where=length > 0)
+    return np.repeat(n, 3, axis=0)
+
+
+def index_mesh(positions, normals, uvs, tris):
+    # tris is an int array of shape (triangles, 3, 3) of (position, uv, normal) indices as produced
+    # by objparse; pass uvs=None (or -1 uv indices) for untextured models.
+    # corners without a normal ('f v', 'f v/vt') get their triangle's face normal, and corners
+    # without a uv get (0, 0) when others have one.
+    # every distinct (position, uv, normal) value combination becomes exactly one output vertex
+    positions = np.asarray(positions)
+    tris = np.asarray(tris)
+    corners = tris.reshape(-1, 3)
+    has_normal = corners[:, 2] >= 0
+    has_uv = corners[:, 1] >= 0
+    has_uvs = uvs is not None and bool(has_uv.any())
+
+    corner_normals = _face_normals(positions, tris) if not has_normal.all() else None
+    if has_normal.any():
+        given = np.asarray(normals)[corners[:, 2][has_normal]]
+        if corner_normals is None:
+            corner_normals = given
+        else:
+            corner_normals[has_normal] = given
+    columns = [positions[corners[:, 0]], corner_normals]
+    if has_uvs:
+        corner_uvs = np.zeros((len(corners), 2), dtype=np.float32)
+        corner_uvs[has_uv] = np.asarray(uvs)[corners[:, 1][has_uv]]
+        columns.append(corner_uvs)
+    # adding 0.0 folds -0.0 into 0.0 so they hash the same
+    attribs = np.ascontiguousarray(np.concatenate(columns, axis=1), dtype=np.float32) + np.float32(0)
+
+    # hash whole attribute rows at once by viewing each row as a single opaque value
+    rows = attribs.view(np.dtype((np.void, attribs.dtype.itemsize * attribs.shape[1]))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    # np.unique sorts; renumber so vertices keep the order they first appear in
+    order = np.argsort(first)
+    renumber = np.empty_like(order)
+    renumber[order] = np.arange(len(order))
+    unique_rows = attribs[first[order]]
+
+    triangles = renumber[inverse.ravel()].reshape(-1, 3)
+    # corners that collapsed onto the same vertex make a zero-area triangle
+    keep = ((triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2])
+            & (triangles[:, 0] != triangles[:, 2]))
+    triangles = triangles[keep]
+
+    mesh = {
+        'vertices': unique_rows[:, 0:3],
+        'normals': unique_rows[:, 3:6],
+        'triangles': triangles.astype(np.uint32)
+    }
+    if has_uvs:
+        mesh['uvs'] = unique_rows[:, 6:8]
+
+    stats = {
+        'corners': len(corners),
+        'vertices': len(unique_rows),
+        'indices_in': len(corners),
+        'indices_out': triangles.size,
+        'has_uvs': has_uvs
+    }
+    return mesh, stats
+
+
+def _bin_size(num_verts, num_indices, has_uvs):
+    floats_per_vert = 8 if has_uvs else 6
+    index_size = 4 if num_verts > 0xffff else 2
+    index_bytes = num_indices * index_size
+    return HEADER.size + num_verts * floats_per_vert * 4 + index_bytes + (-index_bytes % 4)
+
+
+def report(name, stats):
+    # compares against emitting one vertex per triangle corner, which is what sharing nothing costs
+    before = _bin_size(stats['corners'], stats['indices_in'], stats['has_uvs'])
+    after = _bin_size(stats['vertices'], stats['indices_out'], stats['has_uvs'])
+    saved = 1 - stats['vertices'] / stats['corners'] if stats['corners'] else 0
+    print(f"{name}: {stats['corners']} -> {stats['vertices']} vertices ({saved:.1%} fewer), "
+          f"{stats['indices_in']} -> {stats['indices_out']} indices, "
+          f"{before} -> {after} bytes")
@@ -0,0 +1,193 @@
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+
+# raw text of one 'o' block plus the (v, vt, vn) counts of everything before it in the file,
+# which is all that is needed to parse it on its own. digest is a sha1 of the block's vertex data
+# and of its faces with the indices made local to the object, so it only changes when the object
+# does and not when an object before it in the file gains or loses vertices
+ObjBlock = namedtuple('ObjBlock', ['name', 'digest', 'text', 'offsets'])
+
+# positions/uvs/normals are float32 arrays of shape (n, 3) / (n, 2) / (n, 3).
+# tris is an int32 array of shape (triangles, 3, 3) holding (position, uv, normal) indices local
+# to the object, with -1 wherever the face omits a uv or normal
+ObjObject = namedtuple('ObjObject', ['name', 'positions', 'uvs', 'normals', 'tris'])
+
+# objects are cut out of the file a chunk at a time, so memory is bounded by the largest object
+_CHUNK = 1 << 22
+
+_SPACE = ord(' ')
+_SLASH = ord('/')
+_NEWLINE = ord('\n')
+
+# line prefix -> (first two bytes as a u16 key, prefix length including the space)
+_KINDS = {kind: ((ord(kind[0]) << 8) | ord((kind + ' ')[1]), len(kind) + 1) for kind in ('v', 'vt', 'vn', 'f')}
+
+
+def _blocks(f):
+    # yields (name, bytes) for every 'o' block; text before the first 'o' line has no name
+    name = None
+    pending = b'\n'
+    while True:
+        chunk = f.read(_CHUNK)
+        text = pending + chunk
+        pos = 0
+        while True:
+            i = text.find(b'\no ', pos)
+            if i == -1:
+                break
+            eol = text.find(b'\n', i + 1)
+            if eol == -1:
+                # the 'o' line itself is cut off, wait for the next chunk
+                break
+            yield name, text[pos:i + 1]
+            name = text[i + 3:eol].decode().strip()
+            # keep the newline so an 'o' line right after this one still matches
+            pos = eol
+        pending = text[pos:]
+        if not chunk:
+            yield name, pending
+            return
+
+
+def _split_lines(text):
+    # classifies every line of the block at once and returns, per kind, the bytes of just those
+    # lines with their prefixes blanked out, plus the number of lines
+    buf = np.frombuffer(text + b'\n\n', dtype=np.uint8).copy()
+    buf[buf == ord('\r')] = _SPACE
+    ends = np.flatnonzero(buf == _NEWLINE)[:-1]
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    keys = (buf[starts].astype(np.uint16) << 8) | buf[starts + 1]
+    buf = buf[:ends[-1] + 1]
+    line_of_byte = np.repeat(np.arange(len(starts)), ends - starts + 1)
+
+    out = {}
+    for kind, (key, prefix_len) in _KINDS.items():
+        selected = keys == key
+        lines = np.flatnonzero(selected)
+        for i in range(prefix_len):
+            buf[starts[lines] + i] = _SPACE
+        out[kind] = (buf[selected[line_of_byte]], len(lines))
+    return out
+
+
+def _parse_floats(data, num_lines, width):
+    if num_lines == 0:
+        return np.zeros((0, width), dtype=np.float32)
+    values = np.fromstring(data.tobytes(), dtype=np.float32, sep=' ')
+    return values.reshape(num_lines, -1)[:, :width]
+
+
+def _resolve(indices, count, offset, kind):
+    # obj indices are 1-based, negative ones count back from the latest element
+    resolved = np.where(indices > 0, indices - 1, count + indices) - offset
+    if len(resolved) and (resolved.min() < 0 or resolved.max() >= count - offset):
+        raise ValueError(f'face references a {kind} outside of its object')
+    return resolved
+
+
+def _parse_faces(data, num_faces, offsets, counts):
+    if num_faces == 0:
+        return np.zeros((0, 3, 3), dtype=np.int32)
+
+    first = data[:64].tobytes().split(None, 1)[0]
+    # 'v', 'v/t', 'v//n' or 'v/t/n'
+    columns = [0]
+    if b'//' in first:
+        columns.append(2)
+    elif b'/' in first:
+        columns += [1, 2][:first.count(b'/')]
+
+    data = data.copy()
+    data[data == _SLASH] = _SPACE
+    values = np.fromstring(data.tobytes(), dtype=np.int64, sep=' ')
+    if len(values) % len(columns):
+        raise ValueError('faces mix different vertex/uv/normal layouts')
+    values = values.reshape(-1, len(columns))
+
+    if len(values) == 3 * num_faces:
+        # every face has at least 3 corners, so this can only mean all of them are triangles
+        sizes = np.full(num_faces, 3)
+    else:
+        # count token starts (a non-space after a space) on each face line
+        is_token = (data != _SPACE) & (data != _NEWLINE)
+        token_starts = is_token & ~np.concatenate(([False], is_token[:-1]))
+        line_ends = np.flatnonzero(data == _NEWLINE)
+        per_line = np.add.reduceat(token_starts, np.concatenate(([0], line_ends[:-1] + 1)))
+        sizes = per_line // len(columns)
+        if sizes.sum() != len(values) or len(sizes) != num_faces:
+            raise ValueError('faces mix different vertex/uv/normal layouts')
+
+    corners = np.full((len(values), 3), -1, dtype=np.int32)
+    for i, col in enumerate(columns):
+        kind = ('vertex', 'uv', 'normal')[col]
+        corners[:, col] = _resolve(values[:, i], counts[col], offsets[col], kind)
+
+    # fan triangulate: a face with k corners starting at s gives (s, s+i, s+i+1) for i in 1..k-2
+    starts = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+    tris_per_face = sizes - 2
+    base = np.repeat(starts, tris_per_face)
+    step = np.arange(tris_per_face.sum()) - np.repeat(np.cumsum(tris_per_face) - tris_per_face, tris_per_face) + 1
+    fan = np.stack([base, base + step, base + step + 1], axis=1)
+    return corners[fan]
+
+
+def parse_block(block):
+    lines = _split_lines(block.text)
+    offsets = block.offsets
+    counts = (offsets[0] + lines['v'][1],
+              offsets[1] + lines['vt'][1],
+              offsets[2] + lines['vn'][1])
+    return ObjObject(
+        block.name,
+        _parse_floats(*lines['v'], 3),
+        _parse_floats(*lines['vt'], 2),
+        _parse_floats(*lines['vn'], 3),
+        _parse_faces(*lines['f'], offsets, counts)
+    )
+
+
+def _digest(text, offsets):
+    lines = _split_lines(text)
+    counts = (offsets[0] + lines['v'][1],
+              offsets[1] + lines['vt'][1],
+              offsets[2] + lines['vn'][1])
+    digest = hashlib.sha1()
+    for kind in ('v', 'vt', 'vn'):
+        digest.update(lines[kind][0].tobytes())
+        digest.update(b'\0')
+    try:
+        digest.update(_parse_faces(*lines['f'], offsets, counts).tobytes())
+    except ValueError:
+        # malformed faces fail again when the block is parsed, where the caller can skip just this
+        # object; until then the raw text stands in for them
+        digest.update(text)
+    return digest.hexdigest()
+
+
+def iter_blocks(path, split_objects=True):
+    # yields every non-empty object as an unparsed ObjBlock so callers can hash or ship it elsewhere
+    # before paying for parsing
+    with open(path, 'rb') as f:
+        blocks = _blocks(f) if split_objects else [(None, b'\n' + f.read())]
+        offsets = (0, 0, 0)
+        for name, text in blocks:
+            # every block starts on a newline, so counting '\nv ' counts the 'v' lines
+            counts = (offsets[0] + text.count(b'\nv '),
+                      offsets[1] + text.count(b'\nvt '),
+                      offsets[2] + text.count(b'\nvn '))
+            if counts[0] != offsets[0] or b'\nf ' in text:
+                yield ObjBlock(name, _digest(text, offsets), text, offsets)
+            offsets = counts
+
+
+def iter_objects(path, split_objects=True):
+    # yields one ObjObject per 'o' block, holding only the current block in memory.
+    # with split_objects=False the whole file is returned as a single object
+    for block in iter_blocks(path, split_objects):
+        yield parse_block(block)
+
+
+def read_obj(path):
+    return next(iter_objects(path, split_objects=False))
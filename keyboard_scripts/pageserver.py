@@ -0,0 +1,40 @@
+import argparse
+import asyncio
+import hashlib
+import os
+
+from aiohttp import web
+
+from crawler import page_file
+
+# serves pages recorded with Crawler(record_dir=...) back over http, so a crawl can be run against
+# localhost (e.g. scrape.py --base-url http://localhost:8765) without touching the real site
+
+
+def make_app(page_dir, latency=0.0):
+    async def handle(request):
+        if latency:
+            await asyncio.sleep(latency)
+        path = os.path.join(page_dir, page_file(str(request.rel_url)))
+        if not os.path.isfile(path):
+            raise web.HTTPNotFound()
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        etag = '"' + hashlib.sha1(text.encode()).hexdigest() + '"'
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304, headers={'ETag': etag})
+        return web.Response(text=text, content_type='text/html', headers={'ETag': etag})
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handle)
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='serve recorded pages as a local stand-in for a scraped site')
+    parser.add_argument('page_dir')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before every response')
+    args = parser.parse_args()
+
+    web.run_app(make_app(args.page_dir, args.latency), port=args.port)
@@ -0,0 +1,121 @@
+import argparse
+import json
+import os
+import time
+
+# palette-indexed form of colorway files (keycapsInfo.json, keycapcolors_out.json):
+#   {"version": 1, "palette": [[r, g, b], ...], "sets": {<set name>: <set with every color replaced>}}
+# every [r, g, b] triple in a set becomes an integer index into the palette, and nothing else in
+# these files is an integer, so expand() can put the triples back without knowing the schema.
+# the palette is ordered by how often a color is used, so the common ones get the shortest indices
+VERSION = 1
+
+
+def _is_color(value):
+    return (isinstance(value, list) and len(value) == 3
+            and all(isinstance(c, (int, float)) and not isinstance(c, bool) for c in value))
+
+
+def _count(value, counts):
+    if _is_color(value):
+        key = tuple(value)
+        counts[key] = counts.get(key, 0) + 1
+    elif isinstance(value, list):
+        for v in value:
+            _count(v, counts)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _count(v, counts)
+    elif isinstance(value, int) and not isinstance(value, bool):
+        raise ValueError(f'integer {value} outside of a color would be read back as a palette index')
+
+
+def _replace(value, index):
+    if _is_color(value):
+        return index[tuple(value)]
+    if isinstance(value, list):
+        return [_replace(v, index) for v in value]
+    if isinstance(value, dict):
+        return {k: _replace(v, index) for k, v in value.items()}
+    return value
+
+
+def _expand(value, palette):
+    if isinstance(value, int) and not isinstance(value, bool):
+        return list(palette[value])
+    if isinstance(value, list):
+        return [_expand(v, palette) for v in value]
+    if isinstance(value, dict):
+        return {k: _expand(v, palette) for k, v in value.items()}
+    return value
+
+
+def encode(sets):
+    counts = {}
+    _count(sets, counts)
+    # most used first, ties in order of first use
+    palette = sorted(counts, key=lambda c: -counts[c])
+    index = {color: i for i, color in enumerate(palette)}
+    return {
+        'version': VERSION,
+        'palette': [list(c) for c in palette],
+        'sets': _replace(sets, index)
+    }
+
+
+def expand(encoded, names=None):
+    # back to the original {set name: set} shape; names picks out just some sets
+    if encoded.get('version') != VERSION:
+        raise ValueError(f'unsupported palette version {encoded.get("version")}')
+    palette = encoded['palette']
+    sets = encoded['sets']
+    return {name: _expand(sets[name], palette) for name in (sets if names is None else names)}
+
+
+def palette_path(path):
+    # keycapsInfo.json -> keycapsInfo.palette.json
+    return f'{os.path.splitext(path)[0]}.palette.json'
+
+
+def write_palette(encoded, out_path):
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(encoded, separators=(',', ':')))
+    os.replace(tmp_path, out_path)
+
+
+def _best_time(fn, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write palette-indexed copies of colorway json files')
+    parser.add_argument('files', nargs='+', help='e.g. ../server/assets/keycapsInfo.json keycapcolors_out.json')
+    args = parser.parse_args()
+
+    for path in args.files:
+        with open(path) as f:
+            text = f.read()
+        sets = json.loads(text)
+        encoded = encode(sets)
+        if expand(encoded) != sets:
+            raise ValueError(f'{path} does not survive a round trip')
+
+        write_palette(encoded, palette_path(path))
+        with open(palette_path(path)) as f:
+            out_text = f.read()
+
+        # a consumer of the palette form always pays for expand() too, so it is timed with the parse
+        name = next(iter(sets))
+        plain_time = _best_time(json.loads, text)
+        full_time = _best_time(lambda: expand(json.loads(out_text)))
+        one_time = _best_time(lambda: expand(json.loads(out_text), [name]))
+        print(f'{path}: {len(sets)} sets, {len(encoded["palette"])} distinct colors, '
+              f'{len(text)} -> {len(out_text)} bytes, load {plain_time * 1000:.2f} ms plain, '
+              f'{full_time * 1000:.2f} ms palette with every set expanded, '
+              f'{one_time * 1000:.2f} ms with one set ({name}) expanded')
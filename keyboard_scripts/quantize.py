@@ -0,0 +1,184 @@
+import argparse
+import os
+import struct
+
+import numpy as np
+
+from meshformat import FLAG_UINT32_INDICES, FLAG_UVS, read_mesh
+
+# quantized mesh layout (all little-endian), the compact sibling of meshformat's bin layout:
+#   header: magic 'KBDQ', u16 version, u16 flags, u32 vertex count, u32 index count
+#   f32 position min[3], f32 position step[3], f32 uv min[2], f32 uv step[2]
+#   u16 positions[vertex count * 3]      position = min + q * step
+#   s8/s16 normals[vertex count * 2]     octahedral encoded, s16 only if FLAG_NORMALS16
+#   u16 uvs[vertex count * 2]            (only if FLAG_UVS) uv = min + q * step
+#   u16/u32 indices[index count]         (u32 only if FLAG_UINT32_INDICES)
+# every section starts on a 4 byte boundary
+MAGIC = b'KBDQ'
+VERSION = 1
+HEADER = struct.Struct('<4sHHII10f')
+
+FLAG_NORMALS16 = 4
+
+COMPRESSIONS = ('none', 'zstd', 'brotli')
+COMPRESSION_SUFFIXES = {'none': '', 'zstd': '.zst', 'brotli': '.br'}
+
+
+def _pad(buf):
+    return buf + b'\0' * (-len(buf) % 4)
+
+
+def _quantize_range(values, bits):
+    values = np.asarray(values, dtype=np.float64)
+    low = values.min(axis=0) if len(values) else np.zeros(values.shape[1])
+    extent = values.max(axis=0) - low if len(values) else np.zeros(values.shape[1])
+    step = extent / ((1 << bits) - 1)
+    q = np.zeros(values.shape, dtype=np.uint16)
+    nonzero = step > 0
+    q[:, nonzero] = np.round((values[:, nonzero] - low[nonzero]) / step[nonzero])
+    return q, low.astype(np.float32), step.astype(np.float32)
+
+
+def _dequantize_range(q, low, step):
+    return low + q.astype(np.float32) * step
+
+
+def oct_encode(normals, bits):
+    n = np.asarray(normals, dtype=np.float64)
+    n = n / np.maximum(np.abs(n).sum(axis=1, keepdims=True), 1e-12)
+    xy = n[:, :2].copy()
+    below = n[:, 2] < 0
+    # fold the lower hemisphere over the diagonals of the octahedron
+    signs = np.where(xy[below] >= 0, 1.0, -1.0)
+    xy[below] = (1 - np.abs(xy[below][:, ::-1])) * signs
+    limit = (1 << (bits - 1)) - 1
+    return np.round(np.clip(xy, -1, 1) * limit).astype(np.int8 if bits == 8 else np.int16)
+
+
+def oct_decode(encoded, bits):
+    xy = encoded.astype(np.float32) / ((1 << (bits - 1)) - 1)
+    z = 1 - np.abs(xy).sum(axis=1)
+    t = np.maximum(-z, 0)
+    xy = xy - np.where(xy >= 0, t[:, None], -t[:, None])
+    n = np.concatenate([xy, z[:, None]], axis=1)
+    return n / np.linalg.norm(n, axis=1, keepdims=True)
+
+
+def encode_quantized(mesh, normal_bits=8):
+    verts = mesh['vertices']
+    uvs = mesh.get('uvs')
+    indices = np.asarray(mesh['triangles']).ravel()
+
+    flags = 0
+    if uvs is not None:
+        flags |= FLAG_UVS
+    if len(verts) > 0xffff:
+        flags |= FLAG_UINT32_INDICES
+    if normal_bits == 16:
+        flags |= FLAG_NORMALS16
+
+    q_pos, pos_min, pos_step = _quantize_range(verts, 16)
+    if uvs is not None:
+        q_uvs, uv_min, uv_step = _quantize_range(uvs, 16)
+    else:
+        uv_min = uv_step = np.zeros(2, dtype=np.float32)
+
+    parts = [
+        HEADER.pack(MAGIC, VERSION, flags, len(verts), len(indices), *pos_min, *pos_step, *uv_min, *uv_step),
+        _pad(q_pos.astype('<u2').tobytes()),
+        _pad(oct_encode(mesh['normals'], normal_bits).astype('<i1' if normal_bits == 8 else '<i2').tobytes())
+    ]
+    if uvs is not None:
+        parts.append(_pad(q_uvs.astype('<u2').tobytes()))
+    parts.append(_pad(indices.astype('<u4' if flags & FLAG_UINT32_INDICES else '<u2').tobytes()))
+
+    return b''.join(parts)
+
+
+def decode_quantized(buf):
+    magic, version, flags, num_verts, num_indices, *ranges = HEADER.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError('not a quantized mesh file')
+    if version != VERSION:
+        raise ValueError(f'unsupported quantized mesh version {version}')
+    pos_min, pos_step = np.array(ranges[0:3]), np.array(ranges[3:6])
+    uv_min, uv_step = np.array(ranges[6:8]), np.array(ranges[8:10])
+    normal_bits = 16 if flags & FLAG_NORMALS16 else 8
+
+    offset = HEADER.size
+
+    def take(dtype, count, width):
+        nonlocal offset
+        arr = np.frombuffer(buf, dtype=dtype, count=count * width, offset=offset)
+        offset += arr.nbytes + (-arr.nbytes % 4)
+        return arr.reshape(count, width)
+
+    mesh = {
+        'vertices': _dequantize_range(take('<u2', num_verts, 3), pos_min, pos_step),
+        'normals': oct_decode(take('<i1' if normal_bits == 8 else '<i2', num_verts, 2), normal_bits)
+    }
+    if flags & FLAG_UVS:
+        mesh['uvs'] = _dequantize_range(take('<u2', num_verts, 2), uv_min, uv_step)
+    mesh['triangles'] = take('<u4' if flags & FLAG_UINT32_INDICES else '<u2', num_indices // 3, 3)
+
+    return mesh
+
+
+def compress(buf, method):
+    if method == 'zstd':
+        import zstandard
+        return zstandard.ZstdCompressor(level=19).compress(buf)
+    if method == 'brotli':
+        import brotli
+        return brotli.compress(buf, quality=11)
+    return buf
+
+
+def decompress(buf, method):
+    if method == 'zstd':
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(buf)
+    if method == 'brotli':
+        import brotli
+        return brotli.decompress(buf)
+    return buf
+
+
+def accuracy(mesh, decoded):
+    # max position error in model units, max normal error in degrees, max uv error
+    pos_err = np.abs(np.asarray(mesh['vertices']) - decoded['vertices']).max(initial=0)
+    n = np.asarray(mesh['normals'], dtype=np.float64)
+    n = n / np.linalg.norm(n, axis=1, keepdims=True)
+    cos = np.clip(np.einsum('ij,ij->i', n, decoded['normals']), -1, 1)
+    normal_err = np.degrees(np.arccos(cos)).max(initial=0)
+    uv_err = np.abs(np.asarray(mesh['uvs']) - decoded['uvs']).max(initial=0) if mesh.get('uvs') is not None else 0
+    return pos_err, normal_err, uv_err
+
+
+def quantized_path(path, method):
+    suffix = COMPRESSION_SUFFIXES[method]
+    return f'{os.path.splitext(path)[0]}.qbin{suffix}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='write quantized (and optionally precompressed) copies of mesh assets')
+    parser.add_argument('models', nargs='+', help='.json or .bin mesh assets')
+    parser.add_argument('--normal-bits', type=int, choices=(8, 16), default=8)
+    parser.add_argument('--compress', choices=COMPRESSIONS, default='none')
+    args = parser.parse_args()
+
+    total_in = total_out = 0
+    for path in args.models:
+        mesh = read_mesh(path)
+        encoded = encode_quantized(mesh, args.normal_bits)
+        pos_err, normal_err, uv_err = accuracy(mesh, decode_quantized(encoded))
+        packed = compress(encoded, args.compress)
+        with open(quantized_path(path, args.compress), 'wb') as f:
+            f.write(packed)
+
+        size = os.path.getsize(path)
+        total_in += size
+        total_out += len(packed)
+        print(f'{path}: {size} -> {len(packed)} bytes, max error position {pos_err:.2e}, '
+              f'normal {normal_err:.2f} deg, uv {uv_err:.2e}')
+    print(f'total: {total_in} -> {total_out} bytes ({total_in / max(total_out, 1):.1f}x smaller)')
@@ -1,6 +1,15 @@
-import requests
-import string
+import argparse
+import asyncio
 import json
+import os
+import re
+import string
+
+from checkpoint import Checkpoint, checkpoint_path, compact
+from crawler import Crawler, FetchError
+from httpcache import DEFAULT_ROOT, HttpCache
+from scrapediff import changes_path, diff, record_key, summary, write_changes
+from scraperules import ACCEPT, EXCLUDE, RULES_PATH, load_rules
 
 # req = requests.get("https://matrixzj.github.io/docs/gmk-keycaps")
 
@@ -81,83 +90,179 @@ import json
 
 
 
-total = []
+BASE_URL = "https://kbdfans.com"
+NUM_PAGES = 9
+OUT_PATH = "keycaps_out2.json"
+# products the rules could not settle, for someone to go through and turn into overrides
+REVIEW_QUEUE_PATH = "keycaps_out2.review_queue.json"
+# answers given with --interactive, so a resumed run only asks about new products
+REVIEW_PATH = "keycaps_out2.review.jsonl"
 
-for i in range(1, 10):
-    req = requests.get("https://kbdfans.com/collections/keycaps?page=" + str(i))
-    content = req.text
 
+def collection_links(content, base_url):
     content = content[content.index("data-collection-container"):content.index("pagination")]
 
-    pages = content.split("<a ")[1:]
-    # bi = 0
-    # for i, p in enumerate(pages):
-    #     if "Valentine 2018" in p:
-    #         bi = i
-
-    # pages = pages[bi:]
-    for p in pages:
+    links = []
+    for p in content.split("<a ")[1:]:
         a = p[p.index("href=") + len("href=")+1:]
-        a = "https://kbdfans.com" + a[:a.index('"')]
+        links.append(base_url + a[:a.index('"')])
+    return links
+
 
-        kc_content = requests.get(a).text
-        kc_content = kc_content[kc_content.index("page-content"):]
-        #kc_content = kc_content[:kc_content.index("</div>")]
-        img = kc_content[kc_content.index("<img ")+5:]
-        img = img[img.index(" src=")+len(" src=")+1:]
-        img = img[:img.index("?")]
+def parse_product(kc_content, a):
+    kc_content = kc_content[kc_content.index("page-content"):]
+    img = kc_content[kc_content.index("<img ")+5:]
+    img = img[img.index(" src=")+len(" src=")+1:]
+    img = img[:img.index("?")]
 
-        title = kc_content[kc_content.index("<h1 "):]
-        title = title[title.index(">")+1:title.index("</h1>")].strip()
+    title = kc_content[kc_content.index("<h1 "):]
+    title = title[title.index(">")+1:title.index("</h1>")].strip()
 
-        r = input("Skip:" + title+ "? ")
-        if r == "y":
-            continue
+    price = kc_content[kc_content.index("data-product-price>")+len("data-product-price"):]
+    price = float(price[price.index("$")+1:price.index("</span>")].strip())
 
-        price = kc_content[kc_content.index("data-product-price>")+len("data-product-price"):]
-        price = float(price[price.index("$")+1:price.index("</span>")].strip())
+    # material and legends are decided from this text by scraperules.py
+    specs = ""
+    if "<ul" in kc_content:
+        specs = kc_content[kc_content.index("<ul"):]
+        specs = specs[:specs.find("</ul>")]
+        specs = " ".join(re.sub("<[^>]*>", " ", specs).split())
 
-        material = "***"
-        legends = "***"
+    return {
+        "Name": title,
+        "Image": img,
+        "Link": a,
+        "Base Price": price,
+        "Colors": [""],
+        "Specs": specs
+    }
+
+
+async def crawl(crawler, base_url=BASE_URL, num_pages=NUM_PAGES, product_workers=8, checkpoint=None):
+    # collection pages are fetched concurrently and feed product links into a queue that a fixed
+    # set of workers drains, so product fetches start as soon as the first collection page is in.
+    # results come back in catalog order (page, then position on the page).
+    # products already in the checkpoint are taken from it instead of being fetched again
+    queue = asyncio.Queue()
+    products = {}
+    order = {}
+    failed = []
+
+    async def collection(page):
+        url = base_url + "/collections/keycaps?page=" + str(page)
         try:
-            specs = kc_content[kc_content.index("<ul"):]
-            specs = specs[:specs.index("</ul>")]
-            if "ABS" in specs:
-                material = "ABS"
-            if "PBT" in specs:
-                if material == "ABS":
-                    material += "**"
-                else:
-                    material = "PBT"
-
-            lower = specs.lower()
-            if "double" in lower and "shot" in lower:
-                legends = "Doubleshot"
-            if "dye" in lower and "sub" in lower:
-                if legends != "***":
-                    legends += "**"
+            links = collection_links(await crawler.fetch(url), base_url)
+        except Exception as e:
+            # one missing collection page only loses its own products
+            print("skipping " + url + ": " + repr(e))
+            failed.append(url)
+            return
+        for i, a in enumerate(links):
+            # a product listed on several pages keeps its earliest position, whichever page loads first
+            if a not in order:
+                order[a] = (page, i)
+                if checkpoint is not None and a in checkpoint:
+                    products[a] = checkpoint.records[a]
                 else:
-                    legends = "Dye-sublimated"
-        except:
-            pass
-
-        obj = {
-            "Name": title,
-            "Image": img,
-            "Link": a,
-            "Base Price": price,
-            "Colors": [""],
-            "Material": material,
-            "Legends": legends
-        }
-
-        total.append(obj)
-        s = json.dumps(total, indent=4)
-        with open("keycaps_out2.json", "w") as f:
-            f.write(s)
-
-    s = json.dumps(total, indent=4)
-    with open("keycaps_out2.json", "w") as f:
-        f.write(s)
+                    await queue.put(a)
+            else:
+                order[a] = min(order[a], (page, i))
+
+    async def product_worker():
+        while True:
+            a = await queue.get()
+            try:
+                products[a] = parse_product(await crawler.fetch(a), a)
+                if checkpoint is not None:
+                    checkpoint.append(a, products[a])
+            except (FetchError, ValueError, IndexError) as e:
+                print("skipping " + a + ": " + repr(e))
+                failed.append(a)
+            except Exception as e:
+                # anything else would end this worker and leave queue.join() waiting on its items
+                print("skipping " + a + " after unexpected error: " + repr(e))
+                failed.append(a)
+            finally:
+                queue.task_done()
+
+    workers = [asyncio.create_task(product_worker()) for _ in range(product_workers)]
+    try:
+        await asyncio.gather(*(collection(page) for page in range(1, num_pages + 1)))
+        await queue.join()
+    finally:
+        for w in workers:
+            w.cancel()
+    if failed:
+        print(str(len(failed)) + " pages could not be fetched or parsed:\n  " + "\n  ".join(sorted(failed)))
+    return [products[a] for a in sorted(products, key=order.get)]
+
+
+async def main(args, checkpoint):
+    cache = None if args.no_cache else HttpCache(args.cache, args.offline)
+    async with Crawler(per_host=args.concurrency, rate=args.rate, retries=args.retries,
+                       record_dir=args.record, cache=cache) as crawler:
+        products = await crawl(crawler, args.base_url.rstrip("/"), args.pages, args.concurrency, checkpoint)
+    print(str(len(products)) + " products in " + str(crawler.requests) + " requests")
+    if cache is not None:
+        print(cache.stats())
+    return products
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="scrape the kbdfans keycap catalog into keycaps_out2.json")
+    parser.add_argument("--base-url", default=BASE_URL, help="e.g. http://localhost:8765 for pageserver.py")
+    parser.add_argument("--pages", type=int, default=NUM_PAGES)
+    parser.add_argument("--concurrency", type=int, default=4, help="simultaneous requests per host")
+    parser.add_argument("--rate", type=float, default=None, help="max requests per second per host")
+    parser.add_argument("--retries", type=int, default=3)
+    parser.add_argument("--record", help="also save every fetched page here for pageserver.py")
+    parser.add_argument("--cache", default=DEFAULT_ROOT, help="http cache directory")
+    parser.add_argument("--no-cache", action="store_true")
+    parser.add_argument("--offline", action="store_true", help="only replay pages from the http cache")
+    parser.add_argument("--rules", default=RULES_PATH)
+    parser.add_argument("--interactive", action="store_true",
+                        help="ask about products the rules can't settle instead of queueing them")
+    parser.add_argument("--resume", action="store_true",
+                        help="reuse products and answers from the checkpoints of an interrupted run")
+    args = parser.parse_args()
+
+    with Checkpoint(checkpoint_path(OUT_PATH), args.resume) as checkpoint:
+        products = asyncio.run(main(args, checkpoint))
+
+    rules = load_rules(args.rules)
+    total = []
+    queue = []
+    excluded = 0
+    with Checkpoint(REVIEW_PATH, args.resume, batch=1) as review:
+        for obj in products:
+            decision, record, reasons = rules.classify(obj, obj.get("Specs", ""))
+            record.pop("Specs", None)
+            if decision == EXCLUDE:
+                excluded += 1
+            elif decision == ACCEPT:
+                total.append(record)
+            elif args.interactive:
+                if record["Link"] not in review:
+                    r = input("Keep:" + record["Name"] + " (" + "; ".join(reasons) + ")? ")
+                    review.append(record["Link"], r == "y")
+                if review.records[record["Link"]]:
+                    total.append(record)
+            else:
+                queue.append({"Link": record["Link"], "Name": record["Name"], "Reasons": reasons,
+                              "Specs": obj.get("Specs", ""), "Record": record})
+    compact(queue, REVIEW_QUEUE_PATH)
+    print(str(len(total)) + " accepted, " + str(excluded) + " excluded, " + str(len(queue)) + " queued for review")
 
+    # what changed since the last snapshot, so downstream steps only redo that
+    previous = []
+    if os.path.exists(OUT_PATH):
+        with open(OUT_PATH) as f:
+            previous = json.loads(f.read())
+    changes = diff(previous, total)
+    # queued records are left out of the snapshot until reviewed, but they weren't taken off the site
+    queued = {record_key(item["Record"]) for item in queue}
+    changes["delete"] = [key for key in changes["delete"] if key not in queued]
+    write_changes(changes, changes_path(OUT_PATH))
+    print(summary(changes))
 
+    compact(total, OUT_PATH)
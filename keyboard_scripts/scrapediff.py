@@ -0,0 +1,91 @@
+import argparse
+import hashlib
+import json
+import os
+
+# what changed between two scrape snapshots. a snapshot is either a list of item records
+# (keycaps_out2.json, keyed by Link, falling back to Name) or a {name: data} dict
+# (keycapcolors_out.json, keycapsInfo.json, keyed by name). records are compared by a hash of their
+# canonical json, and the result only holds what downstream steps have to redo:
+#   {"insert": [record...], "update": [{"key", "fields", "record"}...], "delete": [key...]}
+# for dict snapshots inserted/updated records are [name, data] pairs
+
+
+def record_key(record):
+    return record.get('Link') or record.get('Name')
+
+
+def content_hash(record):
+    return hashlib.sha1(json.dumps(record, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+
+def keyed(snapshot):
+    if isinstance(snapshot, dict):
+        return {name: [name, data] for name, data in snapshot.items()}
+    records = {}
+    for record in snapshot:
+        key = record_key(record)
+        if key in records:
+            raise ValueError(f'{key!r} appears twice in the snapshot')
+        records[key] = record
+    return records
+
+
+def changed_fields(old, new):
+    if isinstance(old, list):
+        old, new = old[1], new[1]
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return []
+    return sorted(k for k in old.keys() | new.keys() if old.get(k) != new.get(k))
+
+
+def diff(old_snapshot, new_snapshot):
+    old = keyed(old_snapshot)
+    new = keyed(new_snapshot)
+    old_hashes = {key: content_hash(record) for key, record in old.items()}
+
+    changes = {'insert': [], 'update': [], 'delete': []}
+    for key, record in new.items():
+        if key not in old:
+            changes['insert'].append(record)
+        elif content_hash(record) != old_hashes[key]:
+            changes['update'].append({'key': key, 'fields': changed_fields(old[key], record), 'record': record})
+    changes['delete'] = [key for key in old if key not in new]
+    return changes
+
+
+def changes_path(path):
+    # keycaps_out2.json -> keycaps_out2.changes.json
+    return f'{os.path.splitext(path)[0]}.changes.json'
+
+
+def summary(changes):
+    return (f'{len(changes["insert"])} inserted, {len(changes["update"])} updated, '
+            f'{len(changes["delete"])} deleted')
+
+
+def write_changes(changes, out_path):
+    tmp_path = out_path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(json.dumps(changes, indent=4))
+    os.replace(tmp_path, out_path)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='diff two scrape snapshots into inserts, updates and deletes')
+    parser.add_argument('old')
+    parser.add_argument('new')
+    parser.add_argument('--out', help='defaults to <new>.changes.json')
+    args = parser.parse_args()
+
+    with open(args.old) as f:
+        old_snapshot = json.loads(f.read())
+    with open(args.new) as f:
+        new_snapshot = json.loads(f.read())
+
+    changes = diff(old_snapshot, new_snapshot)
+    out_path = args.out or changes_path(args.new)
+    write_changes(changes, out_path)
+    for update in changes['update']:
+        print(f'updated {update["key"]}: {", ".join(update["fields"])}')
+    print(f'{summary(changes)} -> {out_path}')
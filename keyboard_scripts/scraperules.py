@@ -0,0 +1,67 @@
+import json
+import re
+
+# declarative replacement for scrape.py's per-product "Skip?" prompt and ABS/PBT guessing.
+# scraperules.json holds (all patterns are case-insensitive regexes):
+#   include     a product title has to match one of these (an empty list lets everything in)
+#   exclude     a title matching any of these is dropped
+#   specs       field -> [{pattern, value}]; a field gets the value whose pattern matches the product's
+#               spec list (or title). none or more than one distinct value means the product needs a look
+#   overrides   product link -> {"skip": true}, {"include": true} and/or field values, settled by hand
+#               for products that ended up in the review queue
+# every product ends up accepted, excluded or queued for review, with the reasons why
+RULES_PATH = 'scraperules.json'
+
+ACCEPT = 'accept'
+EXCLUDE = 'exclude'
+REVIEW = 'review'
+
+
+class Rules:
+    def __init__(self, rules):
+        self.include = [re.compile(p, re.I) for p in rules.get('include', [])]
+        self.exclude = [re.compile(p, re.I) for p in rules.get('exclude', [])]
+        self.specs = {field: [(re.compile(r['pattern'], re.I), r['value']) for r in field_rules]
+                      for field, field_rules in rules.get('specs', {}).items()}
+        self.overrides = rules.get('overrides', {})
+
+    def extract(self, field, text):
+        values = []
+        for pattern, value in self.specs[field]:
+            if pattern.search(text) and value not in values:
+                values.append(value)
+        return values
+
+    def classify(self, record, spec_text):
+        # returns (decision, record with spec fields filled in, reasons)
+        record = dict(record)
+        title = record['Name']
+        override = self.overrides.get(record['Link'], {})
+        if override.get('skip'):
+            return EXCLUDE, record, ['skipped by override']
+
+        reasons = []
+        if not override.get('include'):
+            excluded = [p.pattern for p in self.exclude if p.search(title)]
+            if excluded:
+                return EXCLUDE, record, [f'title matches exclude pattern {p!r}' for p in excluded]
+            if self.include and not any(p.search(title) for p in self.include):
+                return EXCLUDE, record, ['title matches no include pattern']
+
+        for field in self.specs:
+            if field in override:
+                record[field] = override[field]
+                continue
+            # the spec list is what the product states about itself, the title only breaks ties
+            values = self.extract(field, spec_text) or self.extract(field, title)
+            if len(values) == 1:
+                record[field] = values[0]
+            else:
+                record[field] = None
+                reasons.append(f'{field}: ' + (f'ambiguous between {", ".join(values)}' if values else 'not found'))
+        return (REVIEW if reasons else ACCEPT), record, reasons
+
+
+def load_rules(path=RULES_PATH):
+    with open(path) as f:
+        return Rules(json.loads(f.read()))
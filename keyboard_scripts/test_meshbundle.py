@@ -0,0 +1,30 @@
+import gc
+
+import numpy as np
+
+from meshbundle import MeshBundle, write_bundle
+from meshformat import write_mesh
+
+MESH = {
+    'vertices': np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0]], dtype=np.float32),
+    'normals': np.array([[0, 0, 1]] * 3, dtype=np.float32),
+    'uvs': None,
+    'triangles': np.array([[0, 1, 2]], dtype=np.uint32)
+}
+
+
+def test_mesh_outlives_bundle(tmp_path):
+    write_mesh(str(tmp_path / 'R1_1U'), MESH, 'bin')
+    bundle_path = str(tmp_path / 'cherry.bundle')
+    write_bundle(bundle_path, {'R1_1U': (str(tmp_path / 'R1_1U.bin'), 'bin')})
+
+    with MeshBundle(bundle_path) as b:
+        m = b.mesh('R1_1U')
+        fmt, raw = b.raw('R1_1U')
+    # the views still read the mapping after the bundle is closed
+    assert np.array_equal(m['vertices'], MESH['vertices'])
+    assert np.array_equal(m['triangles'].reshape(-1, 3), MESH['triangles'])
+    assert fmt == 'bin' and len(raw) > 0
+    b.close()
+    del m, raw
+    gc.collect()
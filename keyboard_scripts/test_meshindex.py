@@ -0,0 +1,48 @@
+import numpy as np
+
+from meshindex import index_mesh
+from objparse import iter_objects
+
+# one quad without normals, one triangle sharing a normal
+OBJ = """o Plain
+v 0 0 0
+v 1 0 0
+v 1 0 1
+v 0 0 1
+f 1 4 3 2
+o Normals
+v 0 1 0
+v 0 1 1
+v 1 1 0
+vn 0 1 0
+f 5//1 6//1 7//1
+"""
+
+
+def test_faces_without_normals_or_uvs(tmp_path):
+    path = tmp_path / 'caps.obj'
+    path.write_text(OBJ)
+    plain, normals = iter_objects(str(path))
+
+    mesh, stats = index_mesh(plain.positions, plain.normals, plain.uvs, plain.tris)
+    assert not stats['has_uvs'] and 'uvs' not in mesh
+    assert len(mesh['vertices']) == 4 and len(mesh['triangles']) == 2
+    # the face normal of a counter-clockwise quad in the xz plane seen from above
+    assert np.allclose(mesh['normals'], [0, 1, 0])
+
+    mesh, stats = index_mesh(normals.positions, normals.normals, normals.uvs, normals.tris)
+    assert len(mesh['vertices']) == 3
+    assert np.allclose(mesh['normals'], [0, 1, 0])
+
+
+def test_missing_uvs_are_zero():
+    positions = np.array([[0, 0, 0], [1, 0, 0], [0, 1, 0], [1, 1, 0]], dtype=np.float32)
+    normals = np.array([[0, 0, 1]], dtype=np.float32)
+    uvs = np.array([[0.5, 0.5]], dtype=np.float32)
+    tris = np.array([[[0, 0, 0], [1, 0, 0], [2, 0, 0]],
+                     [[1, -1, 0], [3, -1, 0], [2, -1, 0]]])
+    mesh, stats = index_mesh(positions, normals, uvs, tris)
+    assert stats['has_uvs']
+    # the shared corners only have a uv in the first triangle, so they split in two
+    assert len(mesh['vertices']) == 6
+    assert np.allclose(mesh['uvs'][:3], 0.5) and np.allclose(mesh['uvs'][3:], 0)
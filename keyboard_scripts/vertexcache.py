@@ -0,0 +1,231 @@
+import argparse
+import glob
+import os
+
+import numpy as np
+
+from meshformat import read_mesh, write_mesh
+from meshindex import index_mesh
+
+# reorders a mesh for the gpu's post-transform vertex cache and its vertex fetch:
+#   1. identical vertices are welded (switch.json, stabilizer.json and the case come unindexed)
+#   2. triangles are reordered with tom forsyth's linear-speed vertex cache optimisation, which
+#      greedily emits the triangle whose vertices score highest on cache position and on how few
+#      triangles they have left
+#   3. the result is cut into clusters wherever a triangle misses the cache on all three vertices
+#      (nothing carries over between clusters, so moving them costs no cache hits) and the clusters
+#      are sorted outward-facing first so they occlude the rest of the model (sander, nehab &
+#      barczak's overdraw ordering, hard boundaries only)
+#   4. vertices are renumbered in the order the index buffer first uses them
+# quality is measured by simulating a fifo cache: acmr is vertex transforms per triangle
+# (0.5 is ideal for a large grid, 3 is no reuse) and atvr is transforms per unique vertex (1 is ideal)
+MODEL_DIR = '../server/assets/models'
+CACHE_SIZE = 16
+
+# the scoring constants from forsyth's paper, tuned for an lru cache of FORSYTH_CACHE_SIZE
+FORSYTH_CACHE_SIZE = 32
+CACHE_DECAY_POWER = 1.5
+LAST_TRI_SCORE = 0.75
+VALENCE_BOOST_SCALE = 2.0
+VALENCE_BOOST_POWER = 0.5
+
+
+def cache_stats(triangles, num_verts, cache_size=CACHE_SIZE):
+    # (acmr, atvr) of drawing triangles in order through a fifo cache
+    triangles = np.asarray(triangles)
+    if len(triangles) == 0:
+        return 0.0, 0.0
+    stamp = np.full(num_verts, -cache_size - 1, dtype=np.int64)
+    misses = 0
+    for v in triangles.ravel().tolist():
+        # a vertex is still cached if fewer than cache_size misses happened since it was loaded
+        if misses - stamp[v] > cache_size:
+            stamp[v] = misses
+            misses += 1
+    used = len(np.unique(triangles))
+    return misses / len(triangles), misses / used
+
+
+def _vertex_score(cache_pos, remaining):
+    if remaining == 0:
+        return -1.0
+    score = 0.0
+    if cache_pos >= 0:
+        if cache_pos < 3:
+            # the last triangle's vertices get a fixed score so the next one doesn't just reuse them
+            score = LAST_TRI_SCORE
+        else:
+            score = (1 - (cache_pos - 3) / (FORSYTH_CACHE_SIZE - 3)) ** CACHE_DECAY_POWER
+    return score + VALENCE_BOOST_SCALE * remaining ** -VALENCE_BOOST_POWER
+
+
+def forsyth_order(triangles, num_verts):
+    # returns the triangle indices in draw order
+    triangles = np.asarray(triangles).tolist()
+    num_tris = len(triangles)
+    vert_tris = [[] for _ in range(num_verts)]
+    for t, tri in enumerate(triangles):
+        for v in tri:
+            vert_tris[v].append(t)
+
+    remaining = [len(ts) for ts in vert_tris]
+    cache_pos = [-1] * num_verts
+    vert_score = [_vertex_score(-1, n) for n in remaining]
+    tri_score = [sum(vert_score[v] for v in tri) for tri in triangles]
+    emitted = [False] * num_tris
+
+    order = []
+    cache = []
+    best = max(range(num_tris), key=tri_score.__getitem__, default=-1)
+    scan = 0
+    while len(order) < num_tris:
+        if best < 0:
+            # nothing in the cache touches an unemitted triangle: start over somewhere new. forsyth
+            # picks the best scoring triangle overall; any unemitted one is nearly as good and keeps
+            # this linear
+            while emitted[scan]:
+                scan += 1
+            best = scan
+
+        tri = triangles[best]
+        order.append(best)
+        emitted[best] = True
+        for v in tri:
+            remaining[v] -= 1
+            vert_tris[v].remove(best)
+
+        new_cache = list(tri) + [v for v in cache if v not in tri]
+        evicted = new_cache[FORSYTH_CACHE_SIZE:]
+        cache = new_cache[:FORSYTH_CACHE_SIZE]
+        for v in evicted:
+            cache_pos[v] = -1
+            vert_score[v] = _vertex_score(-1, remaining[v])
+        for pos, v in enumerate(cache):
+            cache_pos[v] = pos
+            vert_score[v] = _vertex_score(pos, remaining[v])
+
+        # only triangles around vertices whose score just changed can become the best one
+        best = -1
+        best_score = -1.0
+        for v in cache + evicted:
+            for t in vert_tris[v]:
+                score = tri_score[t] = sum(vert_score[u] for u in triangles[t])
+                if score > best_score and v in cache:
+                    best, best_score = t, score
+    return np.array(order, dtype=np.int64)
+
+
+def _clusters(triangles, cache_size):
+    # start of every run that begins with a triangle missing the fifo cache on all three vertices
+    stamp = {}
+    misses = 0
+    starts = []
+    for t, tri in enumerate(np.asarray(triangles).tolist()):
+        missed = 0
+        for v in tri:
+            if misses - stamp.get(v, -cache_size - 1) > cache_size:
+                stamp[v] = misses
+                misses += 1
+                missed += 1
+        if missed == 3:
+            starts.append(t)
+    return starts
+
+
+def overdraw_order(vertices, triangles, cache_size=CACHE_SIZE):
+    # reorders whole clusters of an already cache-optimised triangle list; returns triangle indices
+    vertices = np.asarray(vertices, dtype=np.float64)
+    triangles = np.asarray(triangles)
+    starts = _clusters(triangles, cache_size)
+    if len(starts) < 2:
+        return np.arange(len(triangles))
+    bounds = list(zip(starts, starts[1:] + [len(triangles)]))
+
+    a, b, c = (vertices[triangles[:, k]] for k in range(3))
+    area_normals = np.cross(b - a, c - a)
+    centroids = (a + b + c) / 3
+    areas = np.linalg.norm(area_normals, axis=1)
+    center = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-12)
+
+    keys = []
+    for start, end in bounds:
+        normal = area_normals[start:end].sum(axis=0)
+        weight = areas[start:end].sum()
+        centroid = (centroids[start:end] * areas[start:end, None]).sum(axis=0) / max(weight, 1e-12)
+        length = np.linalg.norm(normal)
+        # how much the cluster faces away from the middle of the model
+        keys.append(np.dot(centroid - center, normal / length) if length > 0 else 0.0)
+    order = sorted(range(len(bounds)), key=lambda i: -keys[i])
+    return np.concatenate([np.arange(*bounds[i]) for i in order])
+
+
+def fetch_order(mesh):
+    # renumbers vertices by first use so the vertex fetch walks memory forwards; unused ones go
+    triangles = np.asarray(mesh['triangles'])
+    flat = triangles.ravel()
+    _, first = np.unique(flat, return_index=True)
+    used = flat[np.sort(first)]
+    remap = np.full(len(mesh['vertices']), -1, dtype=np.int64)
+    remap[used] = np.arange(len(used))
+
+    out = {key: (np.asarray(value)[used] if value is not None else None)
+           for key, value in mesh.items() if key != 'triangles'}
+    out['triangles'] = remap[triangles].astype(np.uint32)
+    return out
+
+
+def weld(mesh):
+    # exact duplicates become one vertex, via the same dedup the obj converters use
+    tris = np.asarray(mesh['triangles'], dtype=np.int64)
+    uvs = mesh.get('uvs')
+    corners = np.stack([tris, tris if uvs is not None else np.full_like(tris, -1), tris], axis=2)
+    welded, _ = index_mesh(np.asarray(mesh['vertices']), np.asarray(mesh['normals']),
+                           np.asarray(uvs) if uvs is not None else None, corners)
+    return welded
+
+
+def optimize(mesh, cache_size=CACHE_SIZE):
+    mesh = weld(mesh)
+    triangles = np.asarray(mesh['triangles'])
+    triangles = triangles[forsyth_order(triangles, len(mesh['vertices']))]
+    triangles = triangles[overdraw_order(mesh['vertices'], triangles, cache_size)]
+    return fetch_order({**mesh, 'triangles': triangles})
+
+
+def find_models(paths):
+    models = []
+    for path in paths:
+        if os.path.isdir(path):
+            models += sorted(glob.glob(os.path.join(path, '**', '*.json'), recursive=True)
+                             + glob.glob(os.path.join(path, '**', '*.bin'), recursive=True))
+        else:
+            models.append(path)
+    return models
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='reorder mesh assets for the vertex cache and report acmr/atvr')
+    parser.add_argument('models', nargs='*', default=[MODEL_DIR], help='.json/.bin mesh assets or directories of them')
+    parser.add_argument('--cache-size', type=int, default=CACHE_SIZE, help='fifo entries the statistics assume')
+    parser.add_argument('--write', action='store_true', help='overwrite the assets with the optimised meshes')
+    args = parser.parse_args()
+
+    totals = np.zeros(4)
+    for path in find_models(args.models):
+        mesh = read_mesh(path)
+        before = cache_stats(mesh['triangles'], len(mesh['vertices']), args.cache_size)
+        optimized = optimize(mesh, args.cache_size)
+        after = cache_stats(optimized['triangles'], len(optimized['vertices']), args.cache_size)
+        if after[0] >= before[0] and len(optimized['vertices']) >= len(mesh['vertices']):
+            # already optimised (the greedy pass is not idempotent), leave it as it is
+            optimized, after = mesh, before
+        totals += [before[0] * len(mesh['triangles']), after[0] * len(optimized['triangles']),
+                   len(mesh['triangles']), len(optimized['triangles'])]
+        print(f'{path}: acmr {before[0]:.3f} -> {after[0]:.3f}, atvr {before[1]:.3f} -> {after[1]:.3f}, '
+              f'{len(mesh["vertices"])} -> {len(optimized["vertices"])} vertices')
+        if args.write and optimized is not mesh:
+            base, ext = os.path.splitext(path)
+            write_mesh(base, optimized, ext[1:])
+
+    if totals[2]:
+        print(f'overall acmr {totals[0] / totals[2]:.3f} -> {totals[1] / totals[3]:.3f}')